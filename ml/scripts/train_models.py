@@ -1,5 +1,15 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 import joblib
+import sklearn
+from joblib import Parallel, delayed
 
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
@@ -7,13 +17,12 @@ from sklearn.neighbors import KNeighborsClassifier
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LinearRegression
 
-from sklearn.metrics import accuracy_score, classification_report, mean_absolute_error
+from sklearn.metrics import accuracy_score, classification_report, f1_score, mean_absolute_error
 
-# -----------------------------
-# 1. LOAD DATASET
-# -----------------------------
-DATA_PATH = "../data/kerala_energy_1year.csv"
-df = pd.read_csv(DATA_PATH)
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_PATH = os.path.join(BASE_DIR, "data", "kerala_energy_1year.csv")
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+RANDOM_STATE = 42
 
 # -----------------------------
 # COMMON FEATURES
@@ -28,96 +37,275 @@ FEATURES = [
     "Sub_metering_4"
 ]
 
+FORECAST_FEATURES = [
+    "Global_active_power",
+    "Sub_metering_1",
+    "Sub_metering_2",
+    "Sub_metering_3",
+    "Sub_metering_4"
+]
+
 TARGET = "Anomaly_flag"
 
-X = df[FEATURES]
-y = df[TARGET]
+SWEEP_GRID = {
+    "random_forest": {"n_estimators": [50, 100, 200]},
+    "knn": {"n_neighbors": [3, 5, 7, 11]},
+}
+
+# The sweep fits on part of each train split and picks on the held-out rest,
+# so the test split is only ever scored once, by the final models
+SWEEP_SPLITS = {
+    "knn": {"fit_rows": "knn_fit", "eval_rows": "knn_val"},
+    "random_forest": {"fit_rows": "rf_fit", "eval_rows": "rf_val"},
+}
+TEST_ROWS = {"knn": "knn_test", "random_forest": "rf_test"}
+CACHE_VERSION = 2  # bump when the cached splits change
+
 
 # ============================================================
-# 2. KNN CLASSIFICATION (BASELINE)
+# 1. LOAD DATASET ONCE, CACHE PARSED ARRAYS + SPLITS
 # ============================================================
-print("\n🔹 Training KNN Classifier")
+def _file_key(path):
+    stat = os.stat(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
 
-# Scaling required for KNN
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X_scaled, y, test_size=0.2, random_state=42
-)
+def load_dataset(path=DATA_PATH, cache_dir=MODELS_DIR):
+    """
+    Parse the CSV once and compute every train/test split up front.
+    Arrays are cached as .npz next to the models, keyed by file size/mtime.
+    """
+    cache_path = os.path.join(cache_dir, f".dataset_cache_v{CACHE_VERSION}_{_file_key(path)}.npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            return {name: cached[name] for name in cached.files}
 
-knn = KNeighborsClassifier(n_neighbors=5)
-knn.fit(X_train, y_train)
+    df = pd.read_csv(path, usecols=FEATURES + [TARGET])
+    X = df[FEATURES].to_numpy(dtype=np.float64)
+    y = df[TARGET].to_numpy()
 
-y_pred_knn = knn.predict(X_test)
+    # Next-step forecasting target without mutating df (shift(-1) + dropna)
+    power = df["Global_active_power"].to_numpy(dtype=np.float64)
+    X_forecast = df[FORECAST_FEATURES].to_numpy(dtype=np.float64)[:-1]
+    y_forecast = power[1:]
+    keep = np.isfinite(X_forecast).all(axis=1) & np.isfinite(y_forecast)
+    X_forecast, y_forecast = X_forecast[keep], y_forecast[keep]
 
-print("KNN Accuracy:", accuracy_score(y_test, y_pred_knn))
+    rows = np.arange(len(X))
+    knn_train, knn_test = train_test_split(rows, test_size=0.2, random_state=RANDOM_STATE)
+    rf_train, rf_test = train_test_split(rows, test_size=0.2, random_state=RANDOM_STATE, stratify=y)
+    lr_train, lr_test = train_test_split(np.arange(len(X_forecast)), test_size=0.2, random_state=RANDOM_STATE)
+    # Validation rows for the sweep, carved out of the train splits only
+    knn_fit, knn_val = train_test_split(knn_train, test_size=0.2, random_state=RANDOM_STATE)
+    rf_fit, rf_val = train_test_split(rf_train, test_size=0.2, random_state=RANDOM_STATE, stratify=y[rf_train])
+
+    data = {
+        'X': X, 'y': y, 'X_forecast': X_forecast, 'y_forecast': y_forecast,
+        'knn_train': knn_train, 'knn_test': knn_test, 'knn_fit': knn_fit, 'knn_val': knn_val,
+        'rf_train': rf_train, 'rf_test': rf_test, 'rf_fit': rf_fit, 'rf_val': rf_val,
+        'lr_train': lr_train, 'lr_test': lr_test,
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, **data)
+    return data
 
-# Save model
-joblib.dump(knn, "../models/knn_model.pkl")
-joblib.dump(scaler, "../models/knn_scaler.pkl")
 
 # ============================================================
-# 3. RANDOM FOREST (ANOMALY DETECTION - MAIN MODEL)
+# 2. MODEL JOBS (each runs in its own worker)
 # ============================================================
-print("\n🔹 Training Random Forest Anomaly Detector")
+def evaluate_knn(result, data, rows):
+    knn, scaler = result['models']['knn_model.pkl'], result['models']['knn_scaler.pkl']
+    y_true = data['y'][data[rows]]
+    y_pred = knn.predict(scaler.transform(data['X'][data[rows]]))
+    return {'accuracy': accuracy_score(y_true, y_pred), 'f1': f1_score(y_true, y_pred, zero_division=0)}
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42, stratify=y
-)
 
-rf = RandomForestClassifier(
-    n_estimators=100,
-    random_state=42
-)
+def fit_knn(data, n_neighbors=5, n_jobs=1, fit_rows='knn_train', eval_rows='knn_test'):
+    # Scaling required for KNN (fitted on the training rows only)
+    X_train, y_train = data['X'][data[fit_rows]], data['y'][data[fit_rows]]
+    scaler = StandardScaler().fit(X_train)
 
-rf.fit(X_train, y_train)
-y_pred_rf = rf.predict(X_test)
+    knn = KNeighborsClassifier(n_neighbors=n_neighbors, n_jobs=n_jobs)
+    start = time.perf_counter()
+    knn.fit(scaler.transform(X_train), y_train)
+    fit_seconds = time.perf_counter() - start
 
-print("\nRandom Forest Classification Report:")
-print(classification_report(y_test, y_pred_rf))
+    result = {
+        'name': 'knn', 'params': {'n_neighbors': n_neighbors},
+        'models': {'knn_model.pkl': knn, 'knn_scaler.pkl': scaler},
+        'fit_seconds': fit_seconds, 'train_rows': int(len(y_train)),
+    }
+    result['metrics'] = evaluate_knn(result, data, eval_rows)
+    return result
 
-# Feature importance (important for viva)
-print("Feature Importance:")
-for name, importance in zip(FEATURES, rf.feature_importances_):
-    print(f"{name}: {importance:.3f}")
 
-# Save model
-joblib.dump(rf, "../models/rf_anomaly_model.pkl")
+def evaluate_random_forest(result, data, rows):
+    rf = result['models']['rf_anomaly_model.pkl']
+    y_true = data['y'][data[rows]]
+    y_pred = rf.predict(data['X'][data[rows]])
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'f1': f1_score(y_true, y_pred, zero_division=0),
+        'report': classification_report(y_true, y_pred, output_dict=True, zero_division=0),
+        'feature_importance': dict(zip(FEATURES, rf.feature_importances_.tolist())),
+    }
 
-# ============================================================
-# 4. LINEAR REGRESSION (FORECASTING)
-# ============================================================
-print("\n🔹 Training Linear Regression Forecasting Model")
-
-# Create next-step prediction target
-df["Next_power"] = df["Global_active_power"].shift(-1)
-df.dropna(inplace=True)
-
-X_forecast = df[
-    [
-        "Global_active_power",
-        "Sub_metering_1",
-        "Sub_metering_2",
-        "Sub_metering_3",
-        "Sub_metering_4"
-    ]
-]
 
-y_forecast = df["Next_power"]
+def fit_random_forest(data, n_estimators=100, n_jobs=1, fit_rows='rf_train', eval_rows='rf_test'):
+    X_train, y_train = data['X'][data[fit_rows]], data['y'][data[fit_rows]]
+
+    rf = RandomForestClassifier(
+        n_estimators=n_estimators,
+        random_state=RANDOM_STATE,
+        n_jobs=n_jobs
+    )
+    start = time.perf_counter()
+    rf.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    result = {
+        'name': 'random_forest', 'params': {'n_estimators': n_estimators},
+        'models': {'rf_anomaly_model.pkl': rf},
+        'fit_seconds': fit_seconds, 'train_rows': int(len(y_train)),
+    }
+    result['metrics'] = evaluate_random_forest(result, data, eval_rows)
+    return result
+
+
+def fit_linear_forecast(data, n_jobs=1):
+    X, y = data['X_forecast'], data['y_forecast']
+    X_train, X_test = X[data['lr_train']], X[data['lr_test']]
+    y_train, y_test = y[data['lr_train']], y[data['lr_test']]
+
+    lr = LinearRegression(n_jobs=n_jobs)
+    start = time.perf_counter()
+    lr.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    return {
+        'name': 'linear_forecast', 'params': {},
+        'models': {'linear_forecast_model.pkl': lr},
+        'fit_seconds': fit_seconds, 'train_rows': int(len(y_train)),
+        'metrics': {'mae': mean_absolute_error(y_test, lr.predict(X_test))},
+    }
+
+
+FIT_FUNCTIONS = {
+    'knn': fit_knn,
+    'random_forest': fit_random_forest,
+    'linear_forecast': fit_linear_forecast,
+}
+
+EVALUATE_FUNCTIONS = {
+    'knn': evaluate_knn,
+    'random_forest': evaluate_random_forest,
+}
+
+
+def run_jobs(data, jobs, cores, splits=None):
+    """Run (name, params) jobs in parallel processes, splitting cores between them"""
+    splits = splits or {}
+    workers = max(1, min(len(jobs), cores))
+    inner = max(1, cores // workers)
+    return Parallel(n_jobs=workers, backend='loky')(
+        delayed(FIT_FUNCTIONS[name])(data, n_jobs=inner, **params, **splits.get(name, {}))
+        for name, params in jobs
+    )
+
+
+def sweep(data, cores):
+    """
+    Grid search n_estimators / n_neighbors as parallel jobs, best by validation F1.
+    Returns (summary rows, {name: fitted winner}); each winner is scored on
+    its test split once and kept as the final model, not refitted.
+    """
+    jobs = [(name, {param: value})
+            for name, grid in SWEEP_GRID.items()
+            for param, values in grid.items()
+            for value in values]
+    results = run_jobs(data, jobs, cores, SWEEP_SPLITS)
+
+    best = {}
+    for result in results:
+        current = best.get(result['name'])
+        if current is None or result['metrics']['f1'] > current['metrics']['f1']:
+            best[result['name']] = result
+    summary = [{'model': r['name'], 'params': r['params'], 'fit_seconds': r['fit_seconds'],
+                'val_accuracy': r['metrics']['accuracy'], 'val_f1': r['metrics']['f1']} for r in results]
+
+    for name, result in best.items():
+        result['validation'] = {key: result['metrics'][key] for key in ('accuracy', 'f1')}
+        result['metrics'] = EVALUATE_FUNCTIONS[name](result, data, TEST_ROWS[name])
+    return summary, best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train KNN, Random Forest and forecasting models')
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--cores', type=int, default=os.cpu_count() or 1, help='total cores to use')
+    parser.add_argument('--sweep', action='store_true', help='grid-search n_estimators / n_neighbors first')
+    parser.add_argument('--manifest', default=os.path.join(MODELS_DIR, 'training_manifest.json'))
+    args = parser.parse_args()
+
+    data = load_dataset(args.data)
+    print(f"📊 Loaded {len(data['X'])} rows from {args.data}")
+
+    params = {'knn': {'n_neighbors': 5}, 'random_forest': {'n_estimators': 100}, 'linear_forecast': {}}
+    sweep_results = None
+    results = []
+    if args.sweep:
+        print("\n🔹 Hyperparameter sweep (validation split)")
+        sweep_results, best = sweep(data, args.cores)
+        for row in sweep_results:
+            print(f"  {row['model']} {row['params']}: val acc={row['val_accuracy']:.4f} val f1={row['val_f1']:.4f}")
+        # Winners are already fitted and tested; only the rest still needs training
+        results = list(best.values())
+        params = {name: p for name, p in params.items() if name not in best}
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X_forecast, y_forecast, test_size=0.2, random_state=42
-)
+    # ============================================================
+    # 3. TRAIN KNN, RANDOM FOREST, LINEAR REGRESSION CONCURRENTLY
+    # ============================================================
+    print(f"\n🔹 Training {', '.join(params)}")
+    results += run_jobs(data, list(params.items()), args.cores)
 
-lr = LinearRegression()
-lr.fit(X_train, y_train)
+    manifest = {
+        'created_at': datetime.now().isoformat(),
+        'data': {'path': args.data, 'rows': int(len(data['X'])), 'key': _file_key(args.data)},
+        'random_state': RANDOM_STATE,
+        'cores': args.cores,
+        'versions': {'sklearn': sklearn.__version__, 'numpy': np.__version__},
+        'models': {},
+        'sweep': sweep_results,
+    }
 
-y_pred_lr = lr.predict(X_test)
+    for result in results:
+        files = {}
+        for filename, model in result['models'].items():
+            path = os.path.join(MODELS_DIR, filename)
+            joblib.dump(model, path)
+            files[filename] = os.path.getsize(path)
+        manifest['models'][result['name']] = {
+            'params': result['params'],
+            'fit_seconds': round(result['fit_seconds'], 4),
+            'train_rows': result['train_rows'],
+            'size_bytes': files,
+            'metrics': result['metrics'],
+        }
+        if 'validation' in result:
+            manifest['models'][result['name']]['validation'] = result['validation']
 
-print("Forecasting MAE:", mean_absolute_error(y_test, y_pred_lr))
+    knn = manifest['models']['knn']['metrics']
+    rf = manifest['models']['random_forest']['metrics']
+    print("KNN Accuracy:", knn['accuracy'])
+    print("\nRandom Forest Accuracy:", rf['accuracy'], "F1:", rf['f1'])
+    # Feature importance (important for viva)
+    print("Feature Importance:")
+    for name, importance in rf['feature_importance'].items():
+        print(f"{name}: {importance:.3f}")
+    print("Forecasting MAE:", manifest['models']['linear_forecast']['metrics']['mae'])
 
-# Save model
-joblib.dump(lr, "../models/linear_forecast_model.pkl")
+    with open(args.manifest, 'w') as f:
+        json.dump(manifest, f, indent=2, default=float)
 
-print("\n✅ ALL MODELS TRAINED AND SAVED SUCCESSFULLY")
+    print(f"\n📄 Manifest saved: {args.manifest}")
+    print("\n✅ ALL MODELS TRAINED AND SAVED SUCCESSFULLY")
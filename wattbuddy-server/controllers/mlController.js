@@ -2,6 +2,78 @@ const { spawn } = require('child_process');
 const path = require('path');
 const db = require('../db');
 
+// Wire format for ML engine: 'json' (default) or 'binary' (WBF1 frames, see wattbudyy-ml/wire_format.py)
+const ML_WIRE_FORMAT = process.env.ML_WIRE_FORMAT || 'json';
+const WIRE_MAGIC = Buffer.from('WBF1');
+const WIRE_ALIGNMENT = 8;
+const WIRE_ARRAY_FIELDS = ['power_data', 'historical_data'];
+const WIRE_DTYPES = {
+  '<f4': { size: 4, read: (buf, off) => buf.readFloatLE(off) },
+  '<f8': { size: 8, read: (buf, off) => buf.readDoubleLE(off) },
+  '|i1': { size: 1, read: (buf, off) => buf.readInt8(off) },
+  '|u1': { size: 1, read: (buf, off) => buf.readUInt8(off) },
+  '<i4': { size: 4, read: (buf, off) => buf.readInt32LE(off) },
+};
+
+const alignWire = (n) => Math.ceil(n / WIRE_ALIGNMENT) * WIRE_ALIGNMENT;
+
+// Encode request as a WBF1 frame: numeric arrays travel as little-endian float32
+const encodeBinaryRequest = (requestData) => {
+  const fields = {};
+  const arrays = [];
+  const buffers = [];
+
+  for (const [key, value] of Object.entries(requestData)) {
+    const isNumeric = Array.isArray(value) && value.every((v) => typeof v === 'number');
+    if (WIRE_ARRAY_FIELDS.includes(key) && isNumeric) {
+      const data = Buffer.alloc(alignWire(value.length * 4));
+      value.forEach((v, i) => data.writeFloatLE(v, i * 4));
+      arrays.push({ name: key, dtype: '<f4', length: value.length });
+      buffers.push(data);
+    } else {
+      fields[key] = value;
+    }
+  }
+
+  let header = JSON.stringify({ fields, arrays });
+  const headerBytes = Buffer.byteLength(header);
+  header += ' '.repeat(alignWire(8 + headerBytes) - 8 - headerBytes);
+
+  const headerLen = Buffer.alloc(4);
+  headerLen.writeUInt32LE(Buffer.byteLength(header));
+
+  return Buffer.concat([WIRE_MAGIC, headerLen, Buffer.from(header), ...buffers]);
+};
+
+// Decode a WBF1 frame back into a plain object (dotted array names are nested)
+const decodeBinaryResponse = (buf) => {
+  const headerLen = buf.readUInt32LE(4);
+  const header = JSON.parse(buf.toString('utf8', 8, 8 + headerLen));
+  const result = header.fields || {};
+
+  let offset = alignWire(8 + headerLen);
+  for (const spec of header.arrays || []) {
+    const dtype = WIRE_DTYPES[spec.dtype];
+    if (!dtype) throw new Error(`Unsupported dtype ${spec.dtype}`);
+
+    const values = new Array(spec.length);
+    for (let i = 0; i < spec.length; i++) {
+      values[i] = dtype.read(buf, offset + i * dtype.size);
+    }
+
+    const keys = spec.name.split('.');
+    let target = result;
+    for (const key of keys.slice(0, -1)) {
+      target = target[key] = target[key] || {};
+    }
+    target[keys[keys.length - 1]] = values;
+
+    offset = alignWire(offset + spec.length * dtype.size);
+  }
+
+  return result;
+};
+
 // Execute ML engine
 const executeMLEngine = (requestData) => {
   return new Promise((resolve, reject) => {
@@ -9,14 +81,15 @@ const executeMLEngine = (requestData) => {
       path.join(__dirname, '../../wattbudyy-ml/ml_engine.py'),
     ]);
 
-    let output = '';
+    const binary = ML_WIRE_FORMAT === 'binary';
+    const chunks = [];
     let errorOutput = '';
 
-    pythonProcess.stdin.write(JSON.stringify(requestData));
+    pythonProcess.stdin.write(binary ? encodeBinaryRequest(requestData) : JSON.stringify(requestData));
     pythonProcess.stdin.end();
 
     pythonProcess.stdout.on('data', (data) => {
-      output += data.toString();
+      chunks.push(data);
     });
 
     pythonProcess.stderr.on('data', (data) => {
@@ -26,7 +99,10 @@ const executeMLEngine = (requestData) => {
     pythonProcess.on('close', (code) => {
       if (code === 0) {
         try {
-          const result = JSON.parse(output);
+          const output = Buffer.concat(chunks);
+          const result = output.subarray(0, 4).equals(WIRE_MAGIC)
+            ? decodeBinaryResponse(output)
+            : JSON.parse(output.toString());
           resolve(result);
         } catch (error) {
           reject(new Error('Failed to parse ML result'));
@@ -103,18 +179,22 @@ exports.detectAnomalies = async (req, res) => {
 
 // Retrain model with new data
 exports.retrainModel = async (req, res) => {
-  const { userId, trainingData } = req.body;
+  const { userId, trainingData, force } = req.body;
 
   try {
+    // The engine only retrains when the user's readings have drifted, unless forced
     const result = await executeMLEngine({
       user_id: userId,
       action: 'train',
       training_data: trainingData,
+      force: Boolean(force),
     });
 
     res.json({
       success: true,
-      message: 'Model retrained successfully',
+      skipped: Boolean(result.skipped),
+      message: result.skipped ? 'No drift detected, model kept' : 'Model retrained successfully',
+      drift: result.drift,
     });
   } catch (error) {
     console.error('❌ Model retraining error:', error);
@@ -1,8 +1,17 @@
+import argparse
+import json
+import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import IsolationForest
+from decimate import decimate
+from disaggregation import feature_frame
+from load_profile import reading_timestamps
+from ml_engine import EnergyMLEngine
 
 def analyze_dataset(filename, title='Dataset Analysis'):
     """Analyze and visualize dataset"""
@@ -95,15 +104,175 @@ def visualize_datasets():
     plt.show()
 
 
+def dataset_user_id(filename):
+    """Model id for a dataset's own persisted model"""
+    return f"dataset_{os.path.splitext(os.path.basename(filename))[0]}"
+
+
+def dataset_engine(filename, df, power_col, retrain=False):
+    """
+    Engine with a model trained on this dataset (datasets differ in units and
+    level, so one shared model flags all or nothing on most of them).
+    The model is persisted under dataset_user_id and reused until the file
+    is newer than it.
+    """
+    engine = EnergyMLEngine(dataset_user_id(filename))
+    version = engine.store.current_version()
+    if (version is not None and not retrain
+            and os.path.getmtime(engine.store.version_dir(version)) >= os.path.getmtime(filename)
+            and engine._load_version(version)):
+        return engine
+
+    if all(c in df.columns for c in engine.feature_names):
+        trained = engine._train_model(df)
+    else:
+        # Power-only files: train on the same derived features score_dataset uses
+        frame = feature_frame(df[power_col].to_numpy())
+        timestamps = reading_timestamps(df)
+        if timestamps is not None:
+            frame['timestamp'] = timestamps.to_numpy()
+        trained = engine._train_model(frame)
+    if not trained:
+        raise RuntimeError(f"could not train a model on {filename}")
+    return engine
+
+
+def summarize_dataset(filename, user_id=None, max_points=2000, method='minmax', retrain=False):
+    """
+    Headless counterpart of analyze_dataset: scores with the dataset's own
+    persisted model (or user_id's, if given) and returns compact stats plus a
+    decimated series for plotting.
+    """
+    try:
+        df = pd.read_csv(filename)
+    except FileNotFoundError:
+        return {'file': filename, 'error': 'file not found'}
+
+    power_col = 'Global_active_power' if 'Global_active_power' in df.columns else 'Power'
+    label_col = next((c for c in ['Anomaly_flag', 'Anomaly'] if c in df.columns), None)
+    power = df[power_col].to_numpy(dtype=np.float64)
+
+    if user_id is None:
+        try:
+            engine = dataset_engine(filename, df, power_col, retrain)
+        except RuntimeError as e:
+            return {'file': filename, 'error': str(e)}
+    else:
+        engine = EnergyMLEngine(user_id)
+        engine.load_or_train_model()
+    _, detected = engine.score_dataset(df, power_col)
+
+    summary = {
+        'file': filename,
+        'rows': int(len(df)),
+        'power_column': power_col,
+        'power': {
+            'mean': float(np.nanmean(power)),
+            'std': float(np.nanstd(power)),
+            'min': float(np.nanmin(power)),
+            'max': float(np.nanmax(power)),
+        },
+        'model': engine.user_id,
+        'model_version': engine.model_version(),
+        'detected_anomalies': {'count': int(detected.sum()), 'pct': round(float(detected.mean()) * 100, 2)},
+    }
+
+    labels = None
+    if label_col:
+        labels = df[label_col].fillna(0).to_numpy().astype(bool)
+        true_positives = int((labels & detected).sum())
+        summary['labeled_anomalies'] = {'count': int(labels.sum()), 'pct': round(float(labels.mean()) * 100, 2)}
+        summary['precision'] = round(true_positives / max(int(detected.sum()), 1), 4)
+        summary['recall'] = round(true_positives / max(int(labels.sum()), 1), 4)
+
+    keep = decimate(power, max_points, method)
+    flagged = np.flatnonzero(labels) if labels is not None else np.empty(0, dtype=np.int64)
+    summary['_plot'] = {
+        'x': keep, 'y': power[keep],
+        'anomaly_x': flagged, 'anomaly_y': power[flagged],
+    }
+    return summary
+
+
+def headless_report(datasets, summary_path='analysis_summary.json', plot_path='dataset_analysis.png',
+                    user_id=None, workers=None, max_points=2000, method='minmax', dpi=100, retrain=False):
+    """Analyze datasets in parallel without a display; write JSON summary and a small PNG"""
+    plt.switch_backend('Agg')
+
+    if user_id is not None:
+        # Make sure the shared model exists before workers load it concurrently
+        EnergyMLEngine(user_id).load_or_train_model()
+
+    files = [filename for filename, _ in datasets]
+    workers = workers or min(len(files), os.cpu_count() or 1)
+    if workers <= 1:
+        summaries = [summarize_dataset(f, user_id, max_points, method, retrain) for f in files]
+    else:
+        # Per-dataset models have distinct ids, so workers never train the same one
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            summaries = list(pool.map(summarize_dataset, files, [user_id] * len(files),
+                                      [max_points] * len(files), [method] * len(files),
+                                      [retrain] * len(files)))
+
+    if plot_path:
+        fig, axes = plt.subplots(len(datasets), 1, figsize=(14, 12), squeeze=False)
+        for ax, (_, title), summary in zip(axes[:, 0], datasets, summaries):
+            plot = summary.get('_plot')
+            if plot is None:
+                ax.text(0.5, 0.5, f"File not found: {summary['file']}",
+                        ha='center', va='center', transform=ax.transAxes)
+                continue
+            ax.plot(plot['x'], plot['y'], label='Power Consumption', color='blue', alpha=0.7, linewidth=0.6)
+            if len(plot['anomaly_x']):
+                ax.scatter(plot['anomaly_x'], plot['anomaly_y'], color='red', label='Anomalies', s=6)
+            ax.set_title(title, fontsize=12, fontweight='bold')
+            ax.set_xlabel('Time Index')
+            ax.set_ylabel('Power (kW)')
+            ax.legend()
+            ax.grid(True, alpha=0.3)
+        fig.tight_layout()
+        fig.savefig(plot_path, dpi=dpi)
+        plt.close(fig)
+        print(f"📈 Visualization saved: {plot_path}")
+
+    for summary in summaries:
+        summary.pop('_plot', None)
+    with open(summary_path, 'w') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'datasets': summaries}, f, indent=2)
+    print(f"📄 Summary saved: {summary_path}")
+    return summaries
+
+
+DATASETS = [
+    ('synthetic_training_data.csv', 'Main Training Dataset (1 Year)'),
+    ('user_training_low.csv', 'Low Consumption User (90 Days)'),
+    ('user_training_medium.csv', 'Medium Consumption User (90 Days)'),
+    ('user_training_high.csv', 'High Consumption User (90 Days)'),
+    ('user_training_commercial.csv', 'Commercial User (90 Days)'),
+]
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analyze training datasets')
+    parser.add_argument('--headless', action='store_true',
+                        help='no display, reuse persisted per-dataset models, parallel, write summary file')
+    parser.add_argument('--user-id', default=None,
+                        help='score every dataset with this persisted model instead of per-dataset ones (headless)')
+    parser.add_argument('--retrain', action='store_true', help='retrain the per-dataset models (headless)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-points', type=int, default=2000, help='plotted points per series (headless)')
+    parser.add_argument('--decimate', choices=['minmax', 'lttb'], default='minmax')
+    parser.add_argument('--summary', default='analysis_summary.json')
+    parser.add_argument('--plot', default='dataset_analysis.png', help="PNG path, or '' to skip")
+    args = parser.parse_args()
+
+    if args.headless:
+        headless_report(DATASETS, args.summary, args.plot, args.user_id,
+                        args.workers, args.max_points, args.decimate, retrain=args.retrain)
+        raise SystemExit(0)
+
     # Analyze all datasets
-    datasets_to_analyze = [
-        'synthetic_training_data.csv',
-        'user_training_low.csv',
-        'user_training_medium.csv',
-        'user_training_high.csv',
-        'user_training_commercial.csv',
-    ]
+    datasets_to_analyze = [filename for filename, _ in DATASETS]
     
     print("\n" + "="*60)
     print("📊 DATASET ANALYSIS")
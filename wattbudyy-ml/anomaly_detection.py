@@ -1,10 +1,11 @@
+import argparse
+import json
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
-
-# Load dataset
-df = pd.read_csv("kerala_energy_1year.csv")
+from decimate import decimate
+from ml_engine import EnergyMLEngine
 
 # Select features
 features = [
@@ -17,39 +18,93 @@ features = [
     'Sub_metering_4'
 ]
 
-X = df[features]
 
-# Normalize
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+def detect_with_refit(df):
+    """Fit a fresh Isolation Forest on the dataset (interactive mode)"""
+    X = df[features]
+
+    # Normalize
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    # Train model
+    model = IsolationForest(
+        n_estimators=100,
+        contamination=0.05,
+        random_state=42
+    )
+
+    return (model.fit_predict(X_scaled) == -1).astype(int)
+
+
+def detect_with_persisted_model(df, user_id='default'):
+    """Score with the persisted per-user model from ml_engine (headless mode)"""
+    engine = EnergyMLEngine(user_id)
+    engine.load_or_train_model()
+    _, detected = engine.score_dataset(df)
+    return detected.astype(int), engine.model_version()
+
+
+def plot_anomalies(df, max_points=None, method='minmax'):
+    power = df['Global_active_power']
+    if max_points:
+        keep = decimate(power.to_numpy(), max_points, method)
+        power = power.iloc[keep]
+
+    plt.figure(figsize=(14,5))
+    plt.plot(power.index, power.to_numpy(), label='Power Consumption', linewidth=0.6 if max_points else None)
+
+    plt.scatter(
+        df.index[df['anomaly'] == 1],
+        df['Global_active_power'][df['anomaly'] == 1],
+        label='Anomaly'
+    )
+
+    plt.title("Energy Anomaly Detection using Isolation Forest")
+    plt.xlabel("Time Index")
+    plt.ylabel("Global Active Power")
+    plt.legend()
+
 
-# Train model
-model = IsolationForest(
-    n_estimators=100,
-    contamination=0.05,
-    random_state=42
-)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Isolation Forest anomaly detection on a dataset')
+    parser.add_argument('--data', default='kerala_energy_1year.csv')
+    parser.add_argument('--headless', action='store_true',
+                        help='no display, reuse persisted model, write summary and decimated plot')
+    parser.add_argument('--user-id', default='default')
+    parser.add_argument('--max-points', type=int, default=2000)
+    parser.add_argument('--decimate', choices=['minmax', 'lttb'], default='minmax')
+    parser.add_argument('--summary', default='anomaly_summary.json')
+    parser.add_argument('--plot', default='anomaly_detection.png')
+    args = parser.parse_args()
 
-df['anomaly'] = model.fit_predict(X_scaled)
-df['anomaly'] = df['anomaly'].apply(lambda x: 1 if x == -1 else 0)
+    # Load dataset
+    df = pd.read_csv(args.data)
 
-print(df[['Global_active_power', 'anomaly']].head())
-print(df['anomaly'].value_counts())
+    if args.headless:
+        plt.switch_backend('Agg')
+        df['anomaly'], model_version = detect_with_persisted_model(df, args.user_id)
 
-# 🔽🔽🔽 PASTE VISUALIZATION CODE HERE 🔽🔽🔽
+        counts = df['anomaly'].value_counts()
+        with open(args.summary, 'w') as f:
+            json.dump({
+                'file': args.data,
+                'rows': int(len(df)),
+                'model_version': model_version,
+                'anomalies': int(counts.get(1, 0)),
+                'anomaly_pct': round(float(df['anomaly'].mean()) * 100, 2),
+            }, f, indent=2)
+        print(f"📄 Summary saved: {args.summary}")
 
-plt.figure(figsize=(14,5))
-plt.plot(df['Global_active_power'], label='Power Consumption')
+        if args.plot:
+            plot_anomalies(df, args.max_points, args.decimate)
+            plt.savefig(args.plot, dpi=100)
+            print(f"📈 Plot saved: {args.plot}")
+    else:
+        df['anomaly'] = detect_with_refit(df)
 
-plt.scatter(
-    df.index[df['anomaly'] == 1],
-    df['Global_active_power'][df['anomaly'] == 1],
-    label='Anomaly'
-)
+        print(df[['Global_active_power', 'anomaly']].head())
+        print(df['anomaly'].value_counts())
 
-plt.title("Energy Anomaly Detection using Isolation Forest")
-plt.xlabel("Time Index")
-plt.ylabel("Global Active Power")
-plt.legend()
-plt.show()
-# 🔼🔼🔼 END OF VISUALIZATION CODE 🔼🔼🔼
\ No newline at end of file
+        plot_anomalies(df)
+        plt.show()
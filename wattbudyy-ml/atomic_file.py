@@ -0,0 +1,27 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import joblib
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yield a temp path next to `path` and rename it over `path` once the block
+    succeeds, so readers see the old file or the new one, never a partial write.
+    """
+    # pid + thread id: concurrent writers (spawned or resident) never share a temp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def atomic_dump(obj, path):
+    """joblib.dump through atomic_path"""
+    with atomic_path(path) as tmp_path:
+        joblib.dump(obj, tmp_path)
@@ -0,0 +1,299 @@
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from load_profile import SLOTS_PER_DAY, slot_label
+
+DEFAULT_CHUNKSIZE = 1_000_000
+HIGH_AVERAGE_KW = 2.0
+PRIORITY_ORDER = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+class FleetAccumulator:
+    """
+    Per-user running sums for a long-format table (user_id, timestamp, power
+    and optional anomaly/score columns), gathered with bincount over integer
+    user codes so every chunk is one vectorized pass whatever the fleet size.
+    """
+
+    def __init__(self):
+        self.user_index = pd.Index([])
+        self.size = 0
+        self.count = np.zeros(0)
+        self.sum = np.zeros(0)
+        self.sumsq = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        self.last_ts = np.zeros(0, dtype=np.int64)
+        self.last_power = np.zeros(0)
+        self.slot_sum = np.zeros((0, SLOTS_PER_DAY))
+        self.slot_count = np.zeros((0, SLOTS_PER_DAY))
+        self.flagged = np.zeros(0)
+        self.score_min = np.zeros(0)
+        self.score_max = np.zeros(0)
+        self.flagged_score_sum = np.zeros(0)
+        self.has_scores = False
+        self.unparsed = 0  # rows whose timestamp did not parse
+
+    def _grow(self, n_users):
+        """Extend every per-user array to n_users rows (amortized doubling)"""
+        if n_users <= len(self.count):
+            return
+        capacity = max(n_users, 2 * len(self.count), 1024)
+        extra = capacity - len(self.count)
+
+        def extend(array, fill):
+            pad = np.full((extra,) + array.shape[1:], fill, dtype=array.dtype)
+            return np.concatenate([array, pad])
+
+        self.count, self.sum, self.sumsq = extend(self.count, 0), extend(self.sum, 0), extend(self.sumsq, 0)
+        self.min, self.max = extend(self.min, np.inf), extend(self.max, -np.inf)
+        self.last_ts, self.last_power = extend(self.last_ts, np.iinfo(np.int64).min), extend(self.last_power, 0)
+        self.slot_sum, self.slot_count = extend(self.slot_sum, 0), extend(self.slot_count, 0)
+        self.flagged, self.flagged_score_sum = extend(self.flagged, 0), extend(self.flagged_score_sum, 0)
+        self.score_min, self.score_max = extend(self.score_min, np.inf), extend(self.score_max, -np.inf)
+
+    def _codes(self, user_ids):
+        """Stable integer code per user id, registering new users"""
+        new = pd.Index(pd.unique(user_ids)).difference(self.user_index)
+        if len(new):
+            self.user_index = self.user_index.append(new)
+        self.size = len(self.user_index)
+        self._grow(self.size)
+        return self.user_index.get_indexer(user_ids)
+
+    def add(self, chunk):
+        chunk = chunk[chunk['power'].notna()]
+        if chunk.empty:
+            return
+        codes = self._codes(chunk['user_id'].to_numpy())
+        power = chunk['power'].to_numpy(dtype=np.float64)
+        n = len(self.count)
+
+        self.count += np.bincount(codes, minlength=n)
+        self.sum += np.bincount(codes, weights=power, minlength=n)
+        self.sumsq += np.bincount(codes, weights=power * power, minlength=n)
+
+        extremes = pd.Series(power).groupby(codes).agg(['min', 'max'])
+        groups = extremes.index.to_numpy()
+        self.min[groups] = np.minimum(self.min[groups], extremes['min'].to_numpy())
+        self.max[groups] = np.maximum(self.max[groups], extremes['max'].to_numpy())
+
+        ts = pd.to_datetime(chunk['timestamp'], format='ISO8601', errors='coerce')
+        valid = ts.notna().to_numpy()
+        self.unparsed += int((~valid).sum())
+        if valid.any():
+            ts_ns = ts.to_numpy()[valid].astype('datetime64[ns]').astype(np.int64)
+            vcodes, vpower = codes[valid], power[valid]
+            slots = (ts.dt.hour * 4 + ts.dt.minute // 15).to_numpy()[valid].astype(np.int64)
+            cell = vcodes * SLOTS_PER_DAY + slots
+            self.slot_sum += np.bincount(cell, weights=vpower, minlength=n * SLOTS_PER_DAY).reshape(n, SLOTS_PER_DAY)
+            self.slot_count += np.bincount(cell, minlength=n * SLOTS_PER_DAY).reshape(n, SLOTS_PER_DAY)
+
+            # Latest reading per user: last row of each code after sorting by (code, time)
+            order = np.lexsort((ts_ns, vcodes))
+            last = order[np.r_[vcodes[order][1:] != vcodes[order][:-1], True]]
+            newer = ts_ns[last] > self.last_ts[vcodes[last]]
+            self.last_ts[vcodes[last][newer]] = ts_ns[last][newer]
+            self.last_power[vcodes[last][newer]] = vpower[last][newer]
+
+        if 'anomaly' in chunk.columns:
+            flags = chunk['anomaly'].fillna(0).to_numpy(dtype=np.float64)
+            self.flagged += np.bincount(codes, weights=flags, minlength=n)
+            if 'score' in chunk.columns:
+                self.has_scores = True
+                scores = chunk['score'].to_numpy(dtype=np.float64)
+                bounds = pd.Series(scores).groupby(codes).agg(['min', 'max'])
+                groups = bounds.index.to_numpy()
+                self.score_min[groups] = np.minimum(self.score_min[groups], bounds['min'].to_numpy())
+                self.score_max[groups] = np.maximum(self.score_max[groups], bounds['max'].to_numpy())
+                self.flagged_score_sum += np.bincount(codes, weights=scores * (flags > 0), minlength=n)
+
+    def patterns(self):
+        """get_usage_pattern statistics for every user as arrays"""
+        u = self.size
+        count, total = self.count[:u], self.sum[:u]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            variance = np.maximum(self.sumsq[:u] - total * mean, 0.0) / (count - 1)
+        variance[count < 2] = np.nan
+        return {
+            'average_usage': mean,
+            'peak_usage': self.max[:u],
+            'min_usage': self.min[:u],
+            'std_dev': np.sqrt(variance),
+            'variance': variance,
+        }
+
+    def peak_slots(self, when):
+        """
+        Per-user peak check for the slot of `when` on a 96-slot daily profile
+        (same thresholds as load_profile: mean + 0.5 std, 10th percentile
+        baseline, lowest slot in the next 24h). Users without timestamps
+        get NaN expected load.
+        """
+        u = self.size
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profile = self.slot_sum[:u] / self.slot_count[:u]
+            overall = self.slot_sum[:u].sum(axis=1) / self.slot_count[:u].sum(axis=1)
+        profile = np.where(np.isnan(profile), overall[:, None], profile)
+
+        slot = when.hour * 4 + when.minute // 15
+        expected = profile[:, slot]
+        threshold = profile.mean(axis=1) + 0.5 * profile.std(axis=1)
+        baseline = np.percentile(profile, 10, axis=1)
+        order = (slot + 1 + np.arange(SLOTS_PER_DAY)) % SLOTS_PER_DAY
+        best = order[np.argmin(profile[:, order], axis=1)]
+        return {
+            'is_peak': expected >= threshold,
+            'expected_load': expected,
+            'shiftable_load': np.maximum(expected - baseline, 0.0),
+            'shift_to': best,
+            'slot': slot,
+        }
+
+    def anomalies(self):
+        """is_anomaly and severity per user from optional anomaly/score columns"""
+        u = self.size
+        flagged = self.flagged[:u]
+        severity = np.where(flagged > 0, 50, 0).astype(np.int64)
+        if self.has_scores:
+            spread = self.score_max[:u] - self.score_min[:u]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_flagged = self.flagged_score_sum[:u] / flagged
+                normalized = (mean_flagged - self.score_min[:u]) / spread * 100
+            scored = (flagged > 0) & (spread > 0)
+            severity[scored] = normalized[scored].astype(np.int64)
+        return flagged > 0, severity
+
+
+def evaluate_rules(acc, when):
+    """
+    The generate_suggestions rules as boolean masks over all users.
+    Returns {rule: mask} plus the arrays the messages need.
+    """
+    pattern = acc.patterns()
+    current = acc.last_power[:acc.size]
+    is_anomaly, severity = acc.anomalies()
+    peak = acc.peak_slots(when)
+    with np.errstate(invalid='ignore'):
+        masks = {
+            'high_usage': current > pattern['average_usage'] + 2 * pattern['std_dev'],
+            'anomaly': is_anomaly,
+            'peak': peak['is_peak'],
+            'high_average': pattern['average_usage'] > HIGH_AVERAGE_KW,
+        }
+    return masks, pattern, current, severity, peak
+
+
+def _suggestions(i, masks, pattern, current, severity, peak):
+    """Suggestion dicts for user i, in generate_suggestions order"""
+    avg = pattern['average_usage'][i]
+    suggestions = []
+    if masks['high_usage'][i]:
+        suggestions.append({
+            'title': 'High Usage Detected',
+            'message': f'Your current usage ({current[i]:.1f} kW) is significantly higher than usual ({avg:.1f} kW)',
+            'action': 'Check for devices running unexpectedly',
+            'priority': 'high',
+            'savings_potential': int((current[i] - avg) * 10),
+        })
+    if masks['anomaly'][i]:
+        suggestions.append({
+            'title': 'Anomaly in Usage Pattern',
+            'message': f'Unusual energy consumption detected (severity: {severity[i]}%)',
+            'action': 'Review appliances and check for malfunctions',
+            'priority': 'critical' if severity[i] > 75 else 'high',
+            'savings_potential': int(severity[i] * 0.5),
+        })
+    if masks['peak'][i]:
+        expected = peak['expected_load'][i]
+        share = peak['shiftable_load'][i] / expected if expected else 0
+        suggestions.append({
+            'title': 'Peak Hours Alert',
+            'message': f'{slot_label(peak["slot"])} is one of your peak slots (typically {expected:.1f} kW)',
+            'action': f'Shift about {peak["shiftable_load"][i]:.1f} kW of flexible load to around '
+                      f'{slot_label(int(peak["shift_to"][i]))}',
+            'priority': 'medium',
+            'savings_potential': int(min(share, 1.0) * 30),
+        })
+    if masks['high_average'][i]:
+        suggestions.append({
+            'title': 'Optimize High Consumption',
+            'message': f'Your average usage ({avg:.1f} kW) is high',
+            'action': 'Consider LED lights, efficient appliances, or adjusting thermostat',
+            'priority': 'medium',
+            'savings_potential': 25,
+        })
+    suggestions.sort(key=lambda x: PRIORITY_ORDER.get(x['priority'], 4))
+    return suggestions
+
+
+def _json_float(value):
+    """float for JSON output; NaN (e.g. std of a single reading) becomes null"""
+    return None if np.isnan(value) else float(value)
+
+
+def batch_analyze(path, output_path, when=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Patterns and suggestions for every user in a long-format CSV
+    (user_id, ISO 8601 timestamp, power[, anomaly, score]); writes one JSON line per
+    user to output_path. Returns summary counts.
+    """
+    when = when or datetime.now()
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [c for c in ['user_id', 'timestamp', 'power', 'anomaly', 'score'] if c in header]
+
+    acc = FleetAccumulator()
+    rows = 0
+    for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize, dtype={'user_id': str}):
+        acc.add(chunk)
+        rows += len(chunk)
+
+    masks, pattern, current, severity, peak = evaluate_rules(acc, when)
+    with open(output_path, 'w') as f:
+        for i, user_id in enumerate(acc.user_index):
+            f.write(json.dumps({
+                'user_id': user_id,
+                'current_usage': _json_float(current[i]),
+                'pattern': {key: _json_float(values[i]) for key, values in pattern.items()},
+                'suggestions': _suggestions(i, masks, pattern, current, severity, peak),
+            }) + '\n')
+
+    return {
+        'rows': rows,
+        'users': acc.size,
+        'unparsed_timestamps': acc.unparsed,
+        'suggestions': {rule: int(mask.sum()) for rule, mask in masks.items()},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Patterns and suggestions for every user in one pass')
+    parser.add_argument('readings', help='CSV with user_id, timestamp, power (optional anomaly, score)')
+    parser.add_argument('--output', default='batch_analysis.jsonl')
+    parser.add_argument('--now', default=None, help='evaluate time-of-day rules at this time (ISO format)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        summary = batch_analyze(args.readings, args.output,
+                                datetime.fromisoformat(args.now) if args.now else None, args.chunksize)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ Batch analyze failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ Analyzed {summary['users']} users ({summary['rows']} readings) in {elapsed:.1f}s")
+    if summary['unparsed_timestamps']:
+        print(f"⚠️  {summary['unparsed_timestamps']} readings had unparseable timestamps "
+              f"(counted in totals, left out of time-of-day profiles)")
+    for rule, count in summary['suggestions'].items():
+        print(f"   {rule}: {count} users")
+    print(f"📄 Results saved: {args.output}")
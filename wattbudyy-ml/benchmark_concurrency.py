@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import resource_governor
+from load_test import _spawned_call, build_fleet, load_sources, prepare_models
+from model_store import scratch_models_dir
+
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16]
+DETECT_WINDOW = 96 * 30  # a month of readings per detect request
+
+
+def _requests(worker, household, n_requests, train_every, training_path):
+    """Closed-loop request list for one worker: large detects with a forced retrain every few"""
+    power, timestamps = household['power'], household['timestamps']
+    requests = []
+    for i in range(n_requests):
+        if train_every and i % train_every == train_every - 1:
+            requests.append(('train', {'user_id': household['user_id'], 'action': 'train',
+                                       'training_path': training_path, 'force': True}))
+            continue
+        # Shift the window every request so the result cache never answers
+        start = (worker * 997 + i * 96) % max(len(power) - DETECT_WINDOW, 1)
+        requests.append(('detect', {
+            'user_id': household['user_id'],
+            'action': 'detect',
+            'power_data': power[start:start + DETECT_WINDOW],
+            'timestamps': timestamps[start:start + DETECT_WINDOW].tolist(),
+        }))
+    return requests
+
+
+def run_level(fleet, concurrency, governed, n_requests, train_every, training_path, models_dir):
+    """`concurrency` engines sending requests back to back; returns throughput and latencies"""
+    env = resource_governor.child_env(governed)
+    env['WATTBUDDY_LOCK_DIR'] = os.path.join(models_dir, 'locks')
+    latencies = {'detect': [], 'train': []}
+    errors = []
+
+    def worker(index):
+        household = fleet[index % len(fleet)]
+        for action, request in _requests(index, household, n_requests, train_every, training_path):
+            started = time.perf_counter()
+            try:
+                _spawned_call(request, 'json', models_dir, env)
+                latencies[action].append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors.append(str(e))
+
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    completed = sum(len(values) for values in latencies.values())
+    result = {
+        'concurrency': concurrency,
+        'governed': governed,
+        'requests': completed,
+        'errors': len(errors),
+        'wall_s': wall,
+        'throughput_rps': completed / wall if wall else 0.0,
+        'cpu_s': (children_after.ru_utime + children_after.ru_stime)
+                 - (children_before.ru_utime + children_before.ru_stime),
+    }
+    for action, values in latencies.items():
+        if values:
+            result[f"{action}_p50_ms"] = float(np.percentile(values, 50))
+            result[f"{action}_p95_ms"] = float(np.percentile(values, 95))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate throughput of concurrent engines with and without the governor')
+    parser.add_argument('--levels', type=int, nargs='+', default=CONCURRENCY_LEVELS)
+    parser.add_argument('--requests', type=int, default=6, help='requests per worker')
+    parser.add_argument('--train-every', type=int, default=3, help='every Nth request is a forced retrain (0: none)')
+    parser.add_argument('--output', default=None, help='optional JSON results path')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(os.path.dirname(__file__))
+    training_path = os.path.join(data_dir, 'synthetic_training_data.csv')
+    sources = load_sources(data_dir)
+    fleet = build_fleet(sources, max(args.levels), DETECT_WINDOW)
+
+    results = []
+    with scratch_models_dir('wattbuddy_concurrency_') as models_dir:
+        print(f"🏠 Preparing models for {len(fleet)} households...")
+        prepare_models(fleet, sources, models_dir)
+        for concurrency in args.levels:
+            for governed in (False, True):
+                results.append(run_level(fleet, concurrency, governed, args.requests,
+                                         args.train_every, training_path, models_dir))
+
+    print("\n" + "="*60)
+    print(f"⚙️  CONCURRENCY: {os.cpu_count()} cores, budget {resource_governor.CORE_BUDGET}")
+    print("="*60)
+    for concurrency in args.levels:
+        off, on = [r for r in results if r['concurrency'] == concurrency]
+        for row in (off, on):
+            label = 'governed' if row['governed'] else 'ungoverned'
+            print(f"{concurrency:>3} x {label:>10}: {row['throughput_rps']:6.2f} req/s | "
+                  f"detect p95 {row.get('detect_p95_ms', 0):7.0f} ms | "
+                  f"train p95 {row.get('train_p95_ms', 0):7.0f} ms | cpu {row['cpu_s']:.0f}s"
+                  + (f" | {row['errors']} errors" if row['errors'] else ''))
+        if off['throughput_rps']:
+            print(f"    ⚡ throughput x{on['throughput_rps'] / off['throughput_rps']:.2f} with the governor")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📄 Results saved: {args.output}")
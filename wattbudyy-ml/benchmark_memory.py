@@ -0,0 +1,101 @@
+import argparse
+import json
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from ml_engine import EnergyMLEngine
+from model_store import scratch_models_dir
+
+WINDOW_SIZES = [96, 10_000, 100_000, 1_000_000]
+# Detect budget, asserted by default. Scoring blocks cost a few MB whatever the
+# window, so the per-point budget only applies from BUDGET_MIN_POINTS readings.
+DETECT_BYTES_PER_POINT = 200
+BUDGET_MIN_POINTS = 100_000
+
+
+def synthetic_history(n, seed=42):
+    """Daily-cycle household readings with real sub-metering columns"""
+    rng = np.random.default_rng(seed)
+    hours = (np.arange(n) % 96) / 4
+    power = 1.0 + 0.8 * np.sin((hours - 6) / 24 * 2 * np.pi).clip(0) + rng.gamma(2.0, 0.2, n)
+    split = rng.dirichlet([3, 3, 2, 2], n)
+    frame = pd.DataFrame({
+        'timestamp': pd.date_range('2025-01-01', periods=n, freq='15min'),
+        'Global_active_power': power,
+        'Global_intensity': power * 4.3,
+        'Voltage': rng.normal(230.0, 2.0, n),
+    })
+    for i in range(4):
+        frame[f"Sub_metering_{i + 1}"] = power * split[:, i]
+    return frame
+
+
+def peak_bytes(fn, *args):
+    """Peak Python/NumPy allocation while running fn (tracemalloc)"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_benchmark(sizes, train_rows, models_dir):
+    engine = EnergyMLEngine('memory_bench', models_dir)
+    history = synthetic_history(train_rows)
+    results = {'train': {'rows': train_rows, 'peak_bytes': peak_bytes(engine._train_model, history)}}
+
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        power = rng.gamma(2.0, 0.8, n).astype(np.float32)
+        records = [{'Global_active_power': float(p)} for p in power[:min(n, 100_000)]]
+        results[str(n)] = {
+            'detect_peak_bytes': peak_bytes(engine.detect_anomalies, power),
+            'pattern_peak_bytes': peak_bytes(engine.get_usage_pattern, records),
+            'pattern_rows': len(records),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Peak memory per request for large windows')
+    parser.add_argument('--sizes', type=int, nargs='+', default=WINDOW_SIZES)
+    parser.add_argument('--train-rows', type=int, default=100_000)
+    parser.add_argument('--max-bytes-per-point', type=float, default=DETECT_BYTES_PER_POINT,
+                        help=f"fail (exit 1) if a detect request of at least {BUDGET_MIN_POINTS} readings "
+                             f"peaks above this many bytes per reading (0: no check)")
+    parser.add_argument('--output', default=None, help='optional JSON results path')
+    args = parser.parse_args()
+
+    with scratch_models_dir('wattbuddy_mem_bench_') as models_dir:
+        results = run_benchmark(args.sizes, args.train_rows, models_dir)
+
+    print("\n" + "="*60)
+    print("🧠 PEAK MEMORY PER REQUEST")
+    print("="*60)
+    train = results['train']
+    print(f"train {train['rows']:>9} rows: {train['peak_bytes'] / 1e6:8.1f} MB "
+          f"({train['peak_bytes'] / train['rows']:.0f} B/row)")
+
+    failures = []
+    for n in args.sizes:
+        r = results[str(n)]
+        per_point = r['detect_peak_bytes'] / n
+        print(f"detect {n:>9} pts: {r['detect_peak_bytes'] / 1e6:8.1f} MB ({per_point:.0f} B/pt) | "
+              f"pattern {r['pattern_rows']} rows: {r['pattern_peak_bytes'] / 1e6:.2f} MB")
+        if args.max_bytes_per_point and n >= BUDGET_MIN_POINTS and per_point > args.max_bytes_per_point:
+            failures.append(n)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📄 Results saved: {args.output}")
+
+    if failures:
+        print(f"❌ Over {args.max_bytes_per_point:.0f} B/pt for windows: {failures}", file=sys.stderr)
+        sys.exit(1)
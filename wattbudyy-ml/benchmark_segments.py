@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from ml_engine import EnergyMLEngine
+from model_store import scratch_models_dir
+from segmentation import train_segments
+
+SEGMENT_FILES = {
+    'low': 'user_training_low.csv',
+    'medium': 'user_training_medium.csv',
+    'high': 'user_training_high.csv',
+    'commercial': 'user_training_commercial.csv',
+}
+
+
+def simulated_fleet(n_users, data_dir='.', days=30, seed=42):
+    """Households drawn from the per-segment datasets with random level and window"""
+    rng = np.random.default_rng(seed)
+    sources = {}
+    for name, filename in SEGMENT_FILES.items():
+        df = pd.read_csv(os.path.join(data_dir, filename))
+        df['timestamp'] = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M')
+        sources[name] = df
+
+    readings = days * 96
+    users = {}
+    for i in range(n_users):
+        name = list(SEGMENT_FILES)[i % len(SEGMENT_FILES)]
+        df = sources[name]
+        start = int(rng.integers(0, max(len(df) - readings, 1)))
+        window = df.iloc[start:start + readings]
+        users[f"bench_{i}"] = pd.DataFrame({
+            'timestamp': window['timestamp'].to_numpy(),
+            'power': window['Power'].to_numpy() * rng.uniform(0.8, 1.25),
+        })
+    return users
+
+
+def _dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def _resident_bytes(engine):
+    """In-memory footprint proxy: pickled size of what a worker keeps loaded"""
+    return len(pickle.dumps((engine.anomaly_model, engine.scaler), protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _detect_latency(users, load, models_dir, repeats=3):
+    """Cold load + detect on the last day, as a spawned ml_engine process would do"""
+    timings = []
+    for uid, frame in users.items():
+        window = frame['power'].to_numpy()[-96:].tolist()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            engine = EnergyMLEngine(uid, models_dir)
+            load(engine)
+            engine.detect_anomalies(window)
+            timings.append(time.perf_counter() - start)
+    timings = np.array(timings) * 1000
+    return {'p50_ms': float(np.percentile(timings, 50)), 'p95_ms': float(np.percentile(timings, 95))}
+
+
+def run_benchmark(n_users, n_segments, data_dir, models_dir):
+    users = simulated_fleet(n_users, data_dir)
+    results = {'users': n_users, 'segments': n_segments}
+
+    # Per-user tier: one full forest per household
+    start = time.perf_counter()
+    resident = 0
+    for uid, frame in users.items():
+        engine = EnergyMLEngine(uid, models_dir)
+        engine._train_model(pd.DataFrame({
+            'Global_active_power': frame['power'],
+            'Global_intensity': frame['power'] * 0.5,
+            'Voltage': 230.0,
+            'Sub_metering_1': frame['power'] * 0.3,
+            'Sub_metering_2': frame['power'] * 0.3,
+            'Sub_metering_3': frame['power'] * 0.2,
+            'Sub_metering_4': frame['power'] * 0.2,
+            'timestamp': frame['timestamp'],
+        }))
+        resident += _resident_bytes(engine)
+    per_user_train = time.perf_counter() - start
+    per_user_disk = sum(_dir_bytes(os.path.join(models_dir, f"user_{uid}", 'versions')) for uid in users)
+    results['per_user'] = {
+        'train_s': round(per_user_train, 2),
+        'disk_bytes': per_user_disk,
+        'resident_bytes_all_users': resident,
+        'latency': _detect_latency(users, lambda e: e.load_or_train_model(), models_dir),
+    }
+
+    # Segment tier: one forest per segment + a tiny calibration per user
+    start = time.perf_counter()
+    segments_dir = os.path.join(models_dir, 'segments')
+    train_segments(users, n_segments, segments_dir)
+    segment_train = time.perf_counter() - start
+    probe = EnergyMLEngine(next(iter(users)), models_dir)
+    probe.load_segment_model()
+    results['segment'] = {
+        'train_s': round(segment_train, 2),
+        'disk_bytes': _dir_bytes(segments_dir),
+        'resident_bytes_all_users': _resident_bytes(probe) * n_segments,
+        'latency': _detect_latency(users, lambda e: e.load_segment_model(), models_dir),
+    }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-user vs segment model footprint and latency')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--output', default=None, help='optional JSON results path')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(os.path.dirname(__file__))
+    with scratch_models_dir('wattbuddy_seg_bench_') as models_dir:
+        results = run_benchmark(args.users, args.segments, data_dir, models_dir)
+
+    print("\n" + "="*60)
+    print(f"📊 MODEL TIERS: {args.users} users, {args.segments} segments")
+    print("="*60)
+    for tier in ['per_user', 'segment']:
+        r = results[tier]
+        print(f"{tier:>9}: train {r['train_s']:.1f}s | disk {r['disk_bytes'] / 1e6:.2f} MB | "
+              f"resident {r['resident_bytes_all_users'] / 1e6:.2f} MB | "
+              f"detect p50 {r['latency']['p50_ms']:.1f} ms, p95 {r['latency']['p95_ms']:.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📄 Results saved: {args.output}")
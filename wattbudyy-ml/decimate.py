@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def minmax_decimate(y, n_out):
+    """
+    Indices keeping the min and max of each bucket (about n_out points).
+    Fully vectorized; spikes and drops survive downsampling.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+    valid = ~np.isnan(blocks).all(axis=1)
+
+    offsets = np.arange(buckets)[valid] * size
+    lo = np.nanargmin(blocks[valid], axis=1) + offsets
+    hi = np.nanargmax(blocks[valid], axis=1) + offsets
+    return np.unique(np.concatenate([lo, hi, [0, n - 1]]))
+
+
+def lttb(y, n_out, x=None):
+    """
+    Largest-Triangle-Three-Buckets downsampling; returns selected indices.
+    One vectorized step per output point, so cost is O(n) overall.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start = edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def decimate(y, n_out, method='minmax'):
+    """Indices for plotting y with at most ~n_out points"""
+    if method == 'lttb':
+        return lttb(y, n_out)
+    return minmax_decimate(y, n_out)
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+from load_profile import SLOTS_PER_DAY, reading_timestamps
+
+SUB_METERING_COLUMNS = ['Sub_metering_1', 'Sub_metering_2', 'Sub_metering_3', 'Sub_metering_4']
+ALL_DAY = SLOTS_PER_DAY  # extra row used when readings carry no timestamp
+FIXED_SPLIT = np.array([0.3, 0.3, 0.2, 0.2])
+FEATURE_COLUMNS = ['Global_active_power', 'Global_intensity', 'Voltage'] + SUB_METERING_COLUMNS
+
+
+def feature_matrix(power, submeter_model=None, slots=None):
+    """
+    Derive the anomaly model's features from a bare power series as one
+    float32 (n, 7) array in FEATURE_COLUMNS order, filled in place.
+    """
+    power = np.asarray(power, dtype=np.float32)
+    X = np.empty((len(power), len(FEATURE_COLUMNS)), dtype=np.float32)
+    X[:, 0] = power
+    np.multiply(power, 0.5, out=X[:, 1])
+    X[:, 2] = 230.0
+    if submeter_model is not None:
+        submeter_model.predict(power, slots, out=X[:, 3:])
+    else:
+        # No model trained on real sub-metering: fixed split
+        np.multiply(power[:, None], FIXED_SPLIT, out=X[:, 3:])
+    return X
+
+
+def feature_frame(power, submeter_model=None, slots=None):
+    """Derive the anomaly model's feature frame from a bare power series"""
+    return pd.DataFrame(feature_matrix(power, submeter_model, slots), columns=FEATURE_COLUMNS, copy=False)
+
+
+class SubMeterModel:
+    """
+    Estimates sub-meter channels from total power and time of day.
+    One linear fit per 15-min slot (plus an all-day row), so prediction is a
+    row gather and a multiply-add over the whole batch.
+    """
+
+    def __init__(self, slope, intercept):
+        self.slope = slope          # (97, 4)
+        self.intercept = intercept  # (97, 4)
+
+    @classmethod
+    def fit(cls, df, power_col='Global_active_power'):
+        """Fit from data with real sub-metering; None if there is none"""
+        accumulator = SubMeterAccumulator(power_col)
+        accumulator.add(df)
+        return accumulator.finalize()
+
+    def predict(self, power, slots=None, out=None):
+        """(n, 4) sub-meter estimates; slots are 0-95 or None for all-day"""
+        power = np.asarray(power)
+        rows = ALL_DAY if slots is None else np.asarray(slots, dtype=np.int64)
+        if out is None:
+            out = np.empty((len(power), len(SUB_METERING_COLUMNS)), dtype=np.float64)
+        np.multiply(power[:, None], self.slope[rows], out=out)
+        out += self.intercept[rows]
+        return np.maximum(out, 0.0, out=out)
+
+
+class SubMeterAccumulator:
+    """
+    Per-slot least-squares sums (n, sx, sxx, sy, sxy) gathered with bincount,
+    so SubMeterModel can be fitted from one frame or from streamed chunks.
+    Rows without a timestamp only contribute to the all-day fit.
+    """
+
+    def __init__(self, power_col='Global_active_power'):
+        self.power_col = power_col
+        n_groups = ALL_DAY + 1
+        channels = len(SUB_METERING_COLUMNS)
+        self.n = np.zeros(n_groups)
+        self.sx = np.zeros(n_groups)
+        self.sxx = np.zeros(n_groups)
+        self.sy = np.zeros((n_groups, channels))
+        self.sxy = np.zeros((n_groups, channels))
+        self.has_submetering = False
+
+    def add(self, df):
+        if self.power_col not in df.columns or not all(c in df.columns for c in SUB_METERING_COLUMNS):
+            return
+
+        x = df[self.power_col].to_numpy(dtype=np.float64)
+        y = df[SUB_METERING_COLUMNS].to_numpy(dtype=np.float64)
+        valid = np.isfinite(x) & np.isfinite(y).all(axis=1)
+        if not valid.any():
+            return
+        self.has_submetering |= bool(y[valid].any())
+
+        timestamps = reading_timestamps(df)
+        if timestamps is not None:
+            slots = (timestamps.dt.hour * 4 + timestamps.dt.minute // 15).to_numpy(dtype=np.float64)
+            groups = np.where(np.isnan(slots), ALL_DAY, slots).astype(np.int64)
+        else:
+            groups = np.full(len(x), ALL_DAY, dtype=np.int64)
+
+        x, y, groups = x[valid], y[valid], groups[valid]
+        n_groups = self.n.size
+        self.n += np.bincount(groups, minlength=n_groups)
+        self.sx += np.bincount(groups, weights=x, minlength=n_groups)
+        self.sxx += np.bincount(groups, weights=x * x, minlength=n_groups)
+        for k in range(y.shape[1]):
+            self.sy[:, k] += np.bincount(groups, weights=y[:, k], minlength=n_groups)
+            self.sxy[:, k] += np.bincount(groups, weights=x * y[:, k], minlength=n_groups)
+
+    @staticmethod
+    def _solve(n, sx, sxx, sy, sxy):
+        """Closed-form least squares for each row of sums"""
+        denom = n * sxx - sx * sx
+        ok = (n >= 2) & (np.abs(denom) > 1e-12 * np.maximum(n * sxx, 1.0))
+        safe_denom = np.where(ok, denom, 1.0)[:, None]
+        safe_n = np.maximum(n, 1.0)[:, None]
+
+        slope = np.where(ok[:, None], (n[:, None] * sxy - sx[:, None] * sy) / safe_denom, 0.0)
+        intercept = np.where(ok[:, None], (sy - slope * sx[:, None]) / safe_n, 0.0)
+        return slope, intercept, ok
+
+    def finalize(self):
+        if not self.has_submetering:
+            return None
+
+        slope, intercept, ok = self._solve(self.n, self.sx, self.sxx, self.sy, self.sxy)
+        all_slope, all_intercept, _ = self._solve(
+            self.n.sum(keepdims=True), self.sx.sum(keepdims=True), self.sxx.sum(keepdims=True),
+            self.sy.sum(axis=0, keepdims=True), self.sxy.sum(axis=0, keepdims=True),
+        )
+
+        # Slots without enough data fall back to the all-day fit
+        slope[~ok] = all_slope[0]
+        intercept[~ok] = all_intercept[0]
+        slope[ALL_DAY] = all_slope[0]
+        intercept[ALL_DAY] = all_intercept[0]
+        return SubMeterModel(slope, intercept)
@@ -0,0 +1,175 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from atomic_file import atomic_dump
+
+# Live readings only carry real power; the other features are derived from
+# it, so comparing them with real training columns would always "drift"
+DRIFT_FEATURES = ['Global_active_power']
+DRIFT_FILE = 'drift_state.pkl'
+BINS = 32
+Z_RANGE = 4.0            # bins cover [-4, 4] standard deviations, plus two overflow bins
+PSI_THRESHOLD = 0.25
+KS_THRESHOLD = 0.2
+MIN_SAMPLES = 96 * 2     # two days of 15-minute readings before drift can trigger
+LIVE_WINDOW = 96 * 14    # live histogram decays to about two weeks of readings
+TAIL_SIZE = LIVE_WINDOW  # untimestamped readings kept to recognise overlapping windows
+EPSILON = 1e-4
+
+
+def histogram(z):
+    """(n, F) standardized values -> (F, BINS + 2) counts on fixed z-score bins"""
+    z = np.asarray(z, dtype=np.float64)
+    n_features = z.shape[1]
+    finite = np.isfinite(z)
+    z = np.clip(np.where(finite, z, 0.0), -Z_RANGE - 1, Z_RANGE + 1)
+    idx = np.clip(np.floor((z + Z_RANGE) / (2 * Z_RANGE) * BINS).astype(np.int64) + 1, 0, BINS + 1)
+    flat = (idx + np.arange(n_features) * (BINS + 2))[finite]
+    return np.bincount(flat, minlength=n_features * (BINS + 2)).reshape(n_features, BINS + 2).astype(np.float64)
+
+
+def reference_histogram(X_scaled, feature_names):
+    """Training-time reference for the monitored features of a scaled matrix"""
+    idx = [feature_names.index(name) for name in DRIFT_FEATURES]
+    return {'features': list(DRIFT_FEATURES), 'counts': histogram(np.asarray(X_scaled)[:, idx])}
+
+
+def drift_stats(reference, live):
+    """PSI and histogram KS distance per feature; O(bins), independent of reading count"""
+    p = (reference + EPSILON) / (reference + EPSILON).sum(axis=1, keepdims=True)
+    q = (live + EPSILON) / (live + EPSILON).sum(axis=1, keepdims=True)
+    psi = ((q - p) * np.log(q / p)).sum(axis=1)
+    ks = np.abs(np.cumsum(q, axis=1) - np.cumsum(p, axis=1)).max(axis=1)
+    return psi, ks
+
+
+def _standardize(values, scaler, feature_names, features, power_scale=1.0):
+    """Monitored columns of `values` (dict/DataFrame of raw readings) as z-scores"""
+    columns = []
+    for name in features:
+        i = feature_names.index(name)
+        raw = np.asarray(values[name], dtype=np.float64) if name in values else np.array([])
+        if name != 'Voltage':
+            raw = raw * power_scale
+        columns.append((raw - scaler.mean_[i]) / scaler.scale_[i])
+    n = max(len(c) for c in columns)
+    z = np.full((n, len(features)), np.nan)
+    for j, column in enumerate(columns):
+        z[:len(column), j] = column
+    return z
+
+
+class DriftMonitor:
+    """
+    Live histogram of a user's standardized readings, compared with the
+    reference histogram stored with the model. Updates are one bincount
+    per request and drift checks cost O(bins), whatever the history length.
+    Clients send sliding windows, so each reading is counted once: by
+    timestamp when the request has them, otherwise by matching the start of
+    the window against the end of the previous one.
+    Once drift crosses the thresholds a retrain stays due until the next
+    model version replaces this one.
+    """
+
+    def __init__(self, path, reference, model_version):
+        self.path = path
+        self.reference = reference
+        self.model_version = model_version
+        self.live = np.zeros_like(reference['counts'])
+        self.retrain_due = False
+        self.last_seen = None  # newest observed timestamp (ns)
+        self.tail = np.empty(0)  # end of the last untimestamped window
+
+    @classmethod
+    def load(cls, path, reference, model_version):
+        monitor = cls(path, reference, model_version)
+        if os.path.exists(path):
+            try:
+                state = joblib.load(path)
+                # Live counts only make sense against the model they were gathered for
+                if state.get('model_version') == model_version:
+                    monitor.live = state['live']
+                    monitor.retrain_due = state['retrain_due']
+                    monitor.last_seen = state.get('last_seen')
+                    monitor.tail = state.get('tail', monitor.tail)
+            except Exception:
+                pass
+        return monitor
+
+    def save(self):
+        atomic_dump({
+            'model_version': self.model_version,
+            'live': self.live,
+            'retrain_due': self.retrain_due,
+            'last_seen': self.last_seen,
+            'tail': self.tail,
+        }, self.path)
+
+    def _unseen(self, values, timestamps):
+        """Mask of the readings not observed by an earlier request"""
+        if timestamps is not None:
+            ts = pd.DatetimeIndex(pd.to_datetime(timestamps, errors='coerce'))
+            ns, valid = ts.asi8, ~ts.isna()
+            fresh = valid if self.last_seen is None else valid & (ns > self.last_seen)
+            if valid.any():
+                newest = int(ns[valid].max())
+                self.last_seen = newest if self.last_seen is None else max(self.last_seen, newest)
+            return fresh
+
+        power = np.asarray(values[DRIFT_FEATURES[0]], dtype=np.float64)
+        fresh = np.ones(len(power), dtype=bool)
+        if len(power) == 0:
+            return fresh
+        # Longest prefix of this window that repeats the end of the previous one
+        m = len(self.tail)
+        for j in np.flatnonzero(self.tail == power[0]):
+            overlap = m - j
+            if overlap <= len(power) and np.array_equal(self.tail[j:], power[:overlap]):
+                fresh[:overlap] = False
+                break
+        self.tail = np.concatenate([self.tail, power[fresh]])[-TAIL_SIZE:]
+        return fresh
+
+    def observe(self, values, scaler, feature_names, power_scale=1.0, timestamps=None):
+        """
+        Add raw readings ({feature: values} or DataFrame) to the live histogram,
+        skipping the ones earlier requests already counted.
+        """
+        if any(name not in values for name in self.reference['features']):
+            return
+        z = _standardize(values, scaler, feature_names, self.reference['features'], power_scale)
+        z = z[self._unseen(values, timestamps)]
+        if len(z) == 0:
+            return
+        self.live += histogram(z)
+        totals = self.live.sum(axis=1, keepdims=True)
+        self.live *= np.minimum(1.0, LIVE_WINDOW / np.maximum(totals, 1.0))
+        self.status()
+
+    def compare(self, values, scaler, feature_names, power_scale=1.0):
+        """Drift of a candidate batch (e.g. new training data) against the reference"""
+        missing = [name for name in self.reference['features'] if name not in values]
+        if missing:
+            raise ValueError(f"candidate data has no {', '.join(missing)} column to compare for drift")
+        z = _standardize(values, scaler, feature_names, self.reference['features'], power_scale)
+        return self._evaluate(histogram(z))
+
+    def _evaluate(self, counts):
+        psi, ks = drift_stats(self.reference['counts'], counts)
+        samples = float(counts.sum(axis=1).min()) if len(counts) else 0.0
+        drifted = samples >= MIN_SAMPLES and bool((psi > PSI_THRESHOLD).any() or (ks > KS_THRESHOLD).any())
+        return {
+            'psi': float(psi.max()),
+            'ks': float(ks.max()),
+            'samples': int(samples),
+            'drifted': drifted,
+        }
+
+    def status(self):
+        status = self._evaluate(self.live)
+        self.retrain_due |= status['drifted']
+        status['retrain_due'] = self.retrain_due
+        return status
@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import joblib
+import numpy as np
+
+import resource_governor
+
+# Models produced by ml/scripts/train_models.py, fitted on its FEATURES (real
+# readings in kW). Detect requests that only carry power get derived features,
+# so RF/KNN see an approximation of that set there.
+ML_MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml', 'models')
+SUPERVISED_FEATURES = [
+    'Global_active_power',
+    'Voltage',
+    'Global_intensity',
+    'Sub_metering_1',
+    'Sub_metering_2',
+    'Sub_metering_3',
+    'Sub_metering_4',
+]
+DEFAULT_WEIGHTS = {'isolation_forest': 0.4, 'random_forest': 0.4, 'knn': 0.2}
+IF_TEMPERATURE = 0.02  # softness when mapping IsolationForest scores to [0, 1]
+
+# Shared across requests in long-lived workers; sklearn releases the GIL in
+# tree and neighbor kernels, so members really run in parallel
+_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='ensemble')
+
+
+def _expects_supervised_features(model):
+    """True if a fitted model/scaler was trained on (a subset of) SUPERVISED_FEATURES"""
+    names = getattr(model, 'feature_names_in_', None)
+    if names is not None:
+        return set(names) <= set(SUPERVISED_FEATURES)
+    return getattr(model, 'n_features_in_', len(SUPERVISED_FEATURES)) == len(SUPERVISED_FEATURES)
+
+
+@lru_cache(maxsize=4)
+def load_supervised_models(models_dir=ML_MODELS_DIR):
+    """Load RF and KNN (+ its scaler) once per process; missing files are skipped"""
+    models = {}
+    rf_path = os.path.join(models_dir, 'rf_anomaly_model.pkl')
+    knn_path = os.path.join(models_dir, 'knn_model.pkl')
+    knn_scaler_path = os.path.join(models_dir, 'knn_scaler.pkl')
+    try:
+        # Members already run concurrently; one thread each keeps detect within its share
+        if os.path.exists(rf_path):
+            models['random_forest'] = resource_governor.limit_model_jobs(joblib.load(rf_path), 1)
+        if os.path.exists(knn_path) and os.path.exists(knn_scaler_path):
+            models['knn'] = (resource_governor.limit_model_jobs(joblib.load(knn_path), 1), joblib.load(knn_scaler_path))
+    except Exception as e:
+        print(f"Error loading ensemble models: {e}", file=sys.stderr)
+
+    # Models retrained on another feature set would score garbage; leave them out
+    for name in list(models):
+        fitted = models[name] if name == 'random_forest' else models[name][1]
+        if not _expects_supervised_features(fitted):
+            print(f"Ignoring ensemble member {name}: not trained on {SUPERVISED_FEATURES}", file=sys.stderr)
+            del models[name]
+    return models
+
+
+def _supervised_frame(model, df):
+    """Columns in training order; plain arrays for models fitted without names"""
+    if hasattr(model, 'feature_names_in_'):
+        return df[list(model.feature_names_in_)]
+    return df[SUPERVISED_FEATURES].to_numpy()
+
+
+def _positive_proba(model, X):
+    proba = model.predict_proba(X)
+    classes = list(model.classes_)
+    return proba[:, classes.index(1)] if 1 in classes else np.zeros(len(X))
+
+
+class EnsembleDetector:
+    """
+    Blends IsolationForest with the supervised RF and KNN anomaly models.
+    Members run concurrently; with a latency budget, members that have not
+    finished in time are left out of the blend (the IsolationForest is
+    always waited for). A member already running cannot be stopped: in a
+    long-lived worker it finishes in the background, and the spawned engine
+    exits without waiting for it (see ml_engine's __main__).
+    RF/KNN expect the SUPERVISED_FEATURES columns of the frame they are given.
+    """
+
+    def __init__(self, engine, models_dir=ML_MODELS_DIR, weights=None, mode='weighted',
+                 threshold=0.5, latency_budget_ms=None):
+        self.engine = engine
+        self.supervised = load_supervised_models(models_dir)
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.mode = mode
+        self.threshold = threshold
+        self.latency_budget_ms = latency_budget_ms
+
+    def _isolation_forest(self, df):
+        scores = self.engine._score_frame(df)
+        # Logistic around the decision threshold: 0.5 exactly at the cut-off
+        margin = (self.engine._anomaly_threshold() - scores) / IF_TEMPERATURE
+        return 1.0 / (1.0 + np.exp(-np.clip(margin, -50, 50)))
+
+    def _random_forest(self, df):
+        model = self.supervised['random_forest']
+        return _positive_proba(model, _supervised_frame(model, df))
+
+    def _knn(self, df):
+        model, scaler = self.supervised['knn']
+        X = scaler.transform(_supervised_frame(scaler, df))
+        return _positive_proba(model, X)
+
+    def score(self, df):
+        """
+        Score a feature frame.
+        Returns (probabilities, anomaly flags, info) where info lists the
+        members used/skipped and their wall times in ms.
+        """
+        members = {'isolation_forest': self._isolation_forest}
+        if 'random_forest' in self.supervised:
+            members['random_forest'] = self._random_forest
+        if 'knn' in self.supervised:
+            members['knn'] = self._knn
+        members = {name: fn for name, fn in members.items()
+                   if name == 'isolation_forest' or self.weights.get(name, 0) > 0}
+
+        started = time.perf_counter()
+        timings = {}
+
+        def timed(name, fn):
+            result = fn(df)
+            timings[name] = round((time.perf_counter() - started) * 1000, 2)
+            return result
+
+        futures = {_executor.submit(timed, name, fn): name for name, fn in members.items()}
+        timeout = self.latency_budget_ms / 1000 if self.latency_budget_ms else None
+        done, pending = wait(futures, timeout=timeout)
+
+        # The IsolationForest is the baseline; never answer without it
+        primary = next(f for f, name in futures.items() if name == 'isolation_forest')
+        if primary in pending:
+            primary.result()
+            done, pending = done | {primary}, pending - {primary}
+        # Over budget: drop members still queued behind other requests' work
+        for future in pending:
+            future.cancel()
+
+        outputs = {}
+        for future in done:
+            name = futures[future]
+            try:
+                outputs[name] = future.result()
+            except Exception as e:
+                print(f"Ensemble member {name} failed: {e}", file=sys.stderr)
+        skipped = sorted(set(members) - set(outputs))
+
+        if self.mode == 'vote':
+            votes = np.vstack([p >= 0.5 for p in outputs.values()])
+            probabilities = votes.mean(axis=0)
+            anomalies = probabilities > 0.5
+        else:
+            total = sum(self.weights.get(name, 0) for name in outputs) or 1.0
+            probabilities = sum(self.weights.get(name, 0) * p for name, p in outputs.items()) / total
+            anomalies = probabilities >= self.threshold
+
+        info = {'members': sorted(outputs), 'skipped': skipped, 'timings_ms': timings, 'mode': self.mode}
+        return probabilities, anomalies.astype(np.int8), info
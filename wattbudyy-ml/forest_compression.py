@@ -0,0 +1,403 @@
+import argparse
+import io
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.tree._tree import NODE_DTYPE, Tree
+
+from disaggregation import feature_frame
+from ensemble import SUPERVISED_FEATURES
+
+# 'none' keeps sklearn forests, 'float32' routes float32 inputs exactly like sklearn,
+# 'int16' quantizes thresholds per feature (smaller; falls back to float32 when
+# that alone exceeds the tolerance on the validation rows)
+MODEL_COMPRESSION = os.environ.get('WATTBUDDY_MODEL_COMPRESSION', 'float32')
+# Max share of flagged validation rows (anomalies, or classes other than the most
+# common one) whose label may change from quantization and dropped estimators
+# (0 keeps all of them)
+MODEL_TOLERANCE = float(os.environ.get('WATTBUDDY_MODEL_TOLERANCE', '0.1'))
+ROW_BLOCK = 4096  # rows traversed at once, bounds the (rows x trees) node matrix
+# From this many rows, traversal runs in sklearn's compiled Tree.apply (NumPy
+# stepping is about 3.5x slower on large batches; sklearn trees cost a few ms to build)
+SKLEARN_MIN_ROWS = 512
+VALIDATION_ROWS = 20000  # rows used to choose the estimator count
+
+
+def _average_path_length(n):
+    """Same correction IsolationForest adds at leaves (sklearn's _average_path_length)"""
+    n = np.asarray(n, dtype=np.float64)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    big = n > 2
+    result[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return result
+
+
+def _float32_floor(values):
+    """Largest float32 <= value, so float32(x) <= t matches exactly"""
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+class _PackedTrees:
+    """
+    All trees of a forest packed into flat arrays (feature, threshold,
+    children, leaf payload) and traversed together with NumPy.
+    Leaves point to themselves, so a fixed number of steps reaches every leaf.
+    Large batches are routed by sklearn Tree objects rebuilt from the same
+    arrays (not pickled, so the stored model stays compact).
+    """
+
+    def __init__(self, trees, features_per_tree, n_features, precision='float32'):
+        feature, threshold, left, right, payload, roots, depths = [], [], [], [], [], [], []
+        offset = 0
+        for tree, (tree_, leaf_payload) in enumerate(trees):
+            n_nodes = tree_.node_count
+            is_leaf = tree_.children_left == -1
+            idx = np.arange(n_nodes)
+
+            mapped = np.asarray(features_per_tree[tree])[np.maximum(tree_.feature, 0)] \
+                if features_per_tree is not None else np.maximum(tree_.feature, 0)
+            feature.append(np.where(is_leaf, 0, mapped))
+            threshold.append(np.where(is_leaf, np.inf, tree_.threshold))
+            left.append(np.where(is_leaf, idx, tree_.children_left) + offset)
+            right.append(np.where(is_leaf, idx, tree_.children_right) + offset)
+            payload.append(leaf_payload)
+            roots.append(offset)
+            depths.append(tree_.max_depth)
+            offset += n_nodes
+
+        self.n_features = n_features
+        self.precision = precision
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.max_depth = int(max(depths)) if depths else 0
+        self.feature = np.concatenate(feature).astype(np.int8 if n_features < 128 else np.int16)
+        index_dtype = np.int32 if offset > np.iinfo(np.int16).max else np.int16
+        self.left = np.concatenate(left).astype(index_dtype)
+        self.right = np.concatenate(right).astype(index_dtype)
+        self.payload = np.concatenate(payload).astype(np.float32)
+
+        thresholds = np.concatenate(threshold)
+        if precision == 'int16':
+            self._build_int16(thresholds)
+        else:
+            self.threshold = _float32_floor(thresholds)
+
+    def _build_int16(self, thresholds):
+        """Per-feature linear grid; codes keep order, out-of-range X clips outside"""
+        self.q_lo = np.zeros(self.n_features)
+        self.q_step = np.ones(self.n_features)
+        internal = np.isfinite(thresholds)
+        for f in range(self.n_features):
+            values = thresholds[internal & (self.feature == f)]
+            if len(values):
+                lo, hi = values.min(), values.max()
+                self.q_lo[f] = lo
+                self.q_step[f] = (hi - lo) / 65000 if hi > lo else 1.0
+        codes = np.full(len(thresholds), np.iinfo(np.int16).max, dtype=np.int16)
+        f = self.feature[internal]
+        codes[internal] = np.floor((thresholds[internal] - self.q_lo[f]) / self.q_step[f] - 32500).astype(np.int16)
+        self.threshold = codes
+
+    def _encode(self, X):
+        if self.precision != 'int16':
+            return np.asarray(X, dtype=np.float32)
+        codes = np.floor((np.asarray(X, dtype=np.float64) - self.q_lo) / self.q_step - 32500)
+        return np.clip(codes, -32768, 32766).astype(np.int16)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('_sklearn_trees', None)
+        return state
+
+    def sklearn_trees(self):
+        """(sklearn Tree, root offset) per packed tree, built on first use"""
+        if getattr(self, '_sklearn_trees', None) is None:
+            ends = np.append(self.roots[1:], len(self.left))
+            self._sklearn_trees = []
+            for root, end in zip(self.roots.astype(np.int64), ends.astype(np.int64)):
+                idx = np.arange(end - root)
+                left = self.left[root:end].astype(np.int64) - root
+                leaf = left == idx
+                nodes = np.zeros(len(idx), dtype=NODE_DTYPE)
+                nodes['left_child'] = np.where(leaf, -1, left)
+                nodes['right_child'] = np.where(leaf, -1, self.right[root:end].astype(np.int64) - root)
+                nodes['feature'] = np.where(leaf, -2, self.feature[root:end])
+                nodes['threshold'] = np.where(leaf, -2.0, self.threshold[root:end].astype(np.float64))
+                nodes['n_node_samples'] = 1
+                nodes['weighted_n_node_samples'] = 1.0
+                tree = Tree(self.n_features, np.array([1], dtype=np.intp), 1)
+                tree.__setstate__({'max_depth': self.max_depth, 'node_count': len(idx),
+                                   'nodes': nodes, 'values': np.zeros((len(idx), 1, 1))})
+                self._sklearn_trees.append((tree, root))
+        return self._sklearn_trees
+
+    def _applied(self, X, n_trees):
+        """Leaf node index per tree, via sklearn (X already encoded)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        for tree, root in self.sklearn_trees()[:n_trees]:
+            yield tree.apply(X) + root
+
+    def _block_leaves(self, block, roots):
+        rows = np.arange(len(block))[:, None]
+        node = np.repeat(roots[None, :].astype(np.int64), len(block), axis=0)
+        for _ in range(self.max_depth):
+            go_left = block[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def leaves(self, X, n_trees=None):
+        """Leaf node index per (row, tree) for the first n_trees trees"""
+        roots = self.roots[:n_trees]
+        X = self._encode(X)
+        if len(X) >= SKLEARN_MIN_ROWS:
+            return np.column_stack(list(self._applied(X, len(roots))))
+        result = np.empty((len(X), len(roots)), dtype=np.int64)
+        for start in range(0, len(X), ROW_BLOCK):
+            result[start:start + ROW_BLOCK] = self._block_leaves(X[start:start + ROW_BLOCK], roots)
+        return result
+
+    def mean_payload(self, X, n_trees=None):
+        """Leaf payload averaged over trees, one row block at a time (bounded memory)"""
+        roots = self.roots[:n_trees]
+        X = self._encode(X)
+        result = np.zeros((len(X),) + self.payload.shape[1:], dtype=np.float64)
+        if len(X) >= SKLEARN_MIN_ROWS:
+            for leaves in self._applied(X, len(roots)):
+                result += self.payload[leaves]
+            return result / len(roots)
+        for start in range(0, len(X), ROW_BLOCK):
+            leaves = self._block_leaves(X[start:start + ROW_BLOCK], roots)
+            result[start:start + ROW_BLOCK] = self.payload[leaves].mean(axis=1, dtype=np.float64)
+        return result
+
+
+class _CompactForest:
+    """Shared tree-prefix handling for the compact forests"""
+
+    def _drop_unused_trees(self):
+        trees = self.trees
+        if self.n_estimators >= len(trees.roots):
+            return
+        end = trees.roots[self.n_estimators]
+        trees.roots = trees.roots[:self.n_estimators]
+        trees._sklearn_trees = None
+        for name in ['feature', 'threshold', 'left', 'right', 'payload']:
+            setattr(trees, name, getattr(trees, name)[:end].copy())
+
+
+class CompactIsolationForest(_CompactForest):
+    """Drop-in replacement for a fitted IsolationForest at scoring time"""
+
+    def __init__(self, forest, precision='float32'):
+        trees = []
+        for estimator in forest.estimators_:
+            tree_ = estimator.tree_
+            depth = np.zeros(tree_.node_count)
+            internal = np.flatnonzero(tree_.children_left != -1)
+            # Children always have larger ids than parents in sklearn trees
+            for node in internal:
+                depth[tree_.children_left[node]] = depth[node] + 1
+                depth[tree_.children_right[node]] = depth[node] + 1
+            # Path length contributed by each leaf: depth + expected remaining length
+            trees.append((tree_, depth + _average_path_length(tree_.n_node_samples)))
+
+        # Trees only see a column subset when max_features < 1 (same rule as sklearn)
+        subsampled = getattr(forest, '_max_features', forest.n_features_in_) != forest.n_features_in_
+        features = forest.estimators_features_ if subsampled else None
+        self.trees = _PackedTrees(trees, features, forest.n_features_in_, precision)
+        self.n_estimators = len(forest.estimators_)
+        self.n_features_in_ = forest.n_features_in_
+        self.offset_ = forest.offset_
+        self.path_norm = float(_average_path_length([forest.max_samples_])[0])
+
+    def _path_lengths(self, X, n_trees=None):
+        return self.trees.payload[self.trees.leaves(X, n_trees)]
+
+    def score_samples(self, X):
+        depths = self.trees.mean_payload(X, self.n_estimators)
+        return -(2.0 ** (-depths / self.path_norm))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def truncate(self, X_val, tolerance, reference=None):
+        """
+        Keep the smallest prefix of trees, with the offset re-fitted so the
+        flagged fraction on X_val is unchanged, whose flags differ from
+        `reference` (the uncompressed forest's labels on X_val; default: this
+        forest's own) on at most `tolerance` of the rows either one flags.
+        """
+        path_lengths = self._path_lengths(X_val)
+        if reference is None:
+            reference = self.predict(X_val)
+        flagged = float((reference == -1).mean())
+
+        cumulative = np.cumsum(path_lengths, axis=1, dtype=np.float64)
+        for k in range(10, self.n_estimators, 10):
+            scores = -(2.0 ** (-(cumulative[:, k - 1] / k) / self.path_norm))
+            offset = float(np.quantile(scores, flagged)) if 0 < flagged < 1 else self.offset_
+            if label_disagreement(np.where(scores < offset, -1, 1), reference) <= tolerance:
+                self.n_estimators = k
+                self.offset_ = offset
+                break
+        self._drop_unused_trees()
+        return self
+
+
+class CompactForestClassifier(_CompactForest):
+    """Drop-in replacement for a fitted RandomForestClassifier at predict time"""
+
+    def __init__(self, forest, precision='float32'):
+        trees = []
+        for estimator in forest.estimators_:
+            value = estimator.tree_.value[:, 0, :]
+            totals = value.sum(axis=1, keepdims=True)
+            trees.append((estimator.tree_, value / np.where(totals > 0, totals, 1.0)))
+
+        self.trees = _PackedTrees(trees, None, forest.n_features_in_, precision)
+        self.n_estimators = len(forest.estimators_)
+        self.classes_ = forest.classes_
+        self.n_features_in_ = forest.n_features_in_
+        if hasattr(forest, 'feature_names_in_'):
+            self.feature_names_in_ = forest.feature_names_in_
+
+    def _tree_proba(self, X, n_trees=None):
+        return self.trees.payload[self.trees.leaves(X, n_trees)]
+
+    def predict_proba(self, X):
+        return self.trees.mean_payload(X, self.n_estimators)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def truncate(self, X_val, tolerance, reference=None):
+        """Smallest prefix of trees whose predictions stay within tolerance of `reference` labels"""
+        per_tree = self._tree_proba(X_val)
+        if reference is None:
+            reference = self.predict(X_val)
+        cumulative = np.cumsum(per_tree, axis=1, dtype=np.float64)
+        for k in range(10, self.n_estimators, 10):
+            if label_disagreement(self.classes_[np.argmax(cumulative[:, k - 1], axis=1)], reference) <= tolerance:
+                self.n_estimators = k
+                break
+        self._drop_unused_trees()
+        return self
+
+
+def label_disagreement(labels, reference):
+    """
+    Share of the rows flagged by either side (labels other than the reference's
+    most common one) whose labels differ; 1 - Jaccard for anomaly flags.
+    """
+    values, counts = np.unique(reference, return_counts=True)
+    if len(values) == 0:
+        return 0.0
+    common = values[np.argmax(counts)]
+    flagged = (labels != common) | (reference != common)
+    return float((labels != reference).sum() / max(int(flagged.sum()), 1))
+
+
+def _scores(model, X):
+    """Anomaly scores or class probabilities"""
+    return model.score_samples(X) if hasattr(model, 'offset_') else model.predict_proba(X)
+
+
+def _compact(forest, precision):
+    if hasattr(forest, 'offset_'):
+        return CompactIsolationForest(forest, precision)
+    return CompactForestClassifier(forest, precision)
+
+
+def compress_forest(forest, X_val=None, precision=MODEL_COMPRESSION, tolerance=MODEL_TOLERANCE):
+    """
+    Compress a fitted IsolationForest or RandomForestClassifier.
+    Returns the forest unchanged when compression is disabled.
+    With X_val and a tolerance, quantization and dropped trees together change
+    at most `tolerance` of the flagged labels of the uncompressed forest on (a
+    sample of) X_val (see label_disagreement).
+    """
+    if precision == 'none':
+        return forest
+    compact = _compact(forest, precision)
+    if X_val is not None and tolerance > 0:
+        X_val = np.asarray(X_val)
+        X_val = X_val[::max(1, len(X_val) // VALIDATION_ROWS)]
+        reference = forest.predict(X_val)
+        if precision == 'int16' and label_disagreement(compact.predict(X_val), reference) > tolerance:
+            compact = _compact(forest, 'float32')
+        compact.truncate(X_val, tolerance, reference)
+    return compact
+
+
+def check_parity(original, compact, X):
+    """Score/label agreement between a forest and its compressed version"""
+    X = np.asarray(X)
+    a, b = _scores(original, X), _scores(compact, X)
+    labels = float((original.predict(X) == compact.predict(X)).mean())
+    return {'max_abs_diff': float(np.max(np.abs(a - b))) if len(X) else 0.0, 'label_agreement': labels}
+
+
+def _pickled(model):
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.getvalue()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compress a persisted forest and check parity')
+    parser.add_argument('model', help='pickled IsolationForest or RandomForestClassifier')
+    parser.add_argument('--data', required=True, help='CSV with the model features for parity checks')
+    parser.add_argument('--scaler', default=None, help='scaler to apply before scoring (IsolationForest)')
+    parser.add_argument('--precision', choices=['float32', 'int16'], default='float32')
+    parser.add_argument('--tolerance', type=float, default=MODEL_TOLERANCE,
+                        help='max share of flagged labels allowed to change (0: keep all trees)')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    forest = joblib.load(args.model)
+    names = list(getattr(forest, 'feature_names_in_', []))
+    if not names:
+        # Per-user forests are fitted on scaled arrays in feature_frame order
+        names = list(feature_frame([]).columns) if hasattr(forest, 'offset_') else SUPERVISED_FEATURES
+    df = pd.read_csv(args.data)
+    X = df[names].fillna(0)
+    if args.scaler:
+        X = joblib.load(args.scaler).transform(X)
+    X = np.asarray(X, dtype=np.float64)
+
+    compact = compress_forest(forest, X, args.precision, args.tolerance)
+    parity = check_parity(forest, compact, X)
+
+    original_bytes, compact_bytes = _pickled(forest), _pickled(compact)
+    start = time.perf_counter()
+    joblib.load(io.BytesIO(original_bytes))
+    original_load = time.perf_counter() - start
+    start = time.perf_counter()
+    joblib.load(io.BytesIO(compact_bytes))
+    compact_load = time.perf_counter() - start
+
+    timings = []
+    for model in (forest, compact):
+        _scores(model, X)
+        start = time.perf_counter()
+        _scores(model, X)
+        timings.append(time.perf_counter() - start)
+
+    print(f"🌲 Estimators: {len(forest.estimators_)} -> {compact.n_estimators}")
+    print(f"💾 Size: {len(original_bytes) / 1e6:.2f} MB -> {len(compact_bytes) / 1e6:.2f} MB")
+    print(f"⏱  Load: {original_load * 1000:.1f} ms -> {compact_load * 1000:.1f} ms")
+    print(f"⚡ Score {len(X)} rows: {timings[0] * 1000:.1f} ms -> {timings[1] * 1000:.1f} ms")
+    print(f"🎯 Parity: max |diff| {parity['max_abs_diff']:.2e}, label agreement {parity['label_agreement'] * 100:.2f}%")
+
+    if args.output:
+        joblib.dump(compact, args.output)
+        print(f"💾 Saved: {args.output}")
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+SLOTS_PER_DAY = 96  # 15-minute slots
+DAYS_PER_WEEK = 7
+# Readings averaging above this are exports in W (e.g. the Kerala history), not kW
+WATTS_MEAN_ABOVE = 50.0
+
+
+def slot_of(when):
+    """(weekday, 15-min slot) for a datetime"""
+    return when.weekday(), when.hour * 4 + when.minute // 15
+
+
+def slot_label(slot):
+    """'HH:MM' start time of a 15-minute slot of the day"""
+    return f"{slot // 4:02d}:{(slot % 4) * 15:02d}"
+
+
+def reading_timestamps(df):
+    """Parse reading timestamps from a training frame (timestamp or Date/Time columns)"""
+    if 'timestamp' in df.columns:
+        return pd.to_datetime(df['timestamp'], errors='coerce')
+    if 'Date' in df.columns and 'Time' in df.columns:
+        return pd.to_datetime(
+            df['Date'].astype(str) + ' ' + df['Time'].astype(str),
+            format='%d-%m-%Y %H:%M', errors='coerce'
+        )
+    return None
+
+
+class LoadProfileAccumulator:
+    """Running per-(weekday, slot) sums so the profile can be built from chunks"""
+
+    def __init__(self, power_col='Global_active_power'):
+        self.power_col = power_col
+        self.sums = np.zeros(DAYS_PER_WEEK * SLOTS_PER_DAY)
+        self.counts = np.zeros(DAYS_PER_WEEK * SLOTS_PER_DAY)
+
+    def add(self, df):
+        timestamps = reading_timestamps(df)
+        if timestamps is None or self.power_col not in df.columns:
+            return
+
+        valid = (timestamps.notna() & df[self.power_col].notna()).to_numpy()
+        if not valid.any():
+            return
+
+        ts = timestamps[valid]
+        power = df[self.power_col].to_numpy(dtype=np.float64)[valid]
+        cell = (ts.dt.dayofweek * SLOTS_PER_DAY + ts.dt.hour * 4 + ts.dt.minute // 15).to_numpy(dtype=np.int64)
+        self.sums += np.bincount(cell, weights=power, minlength=self.sums.size)
+        self.counts += np.bincount(cell, minlength=self.counts.size)
+
+    def finalize(self):
+        """
+        Weekday x 96-slot mean load profile, plus per-weekday peak thresholds
+        and baselines, and for every slot the lowest-load slot within the next
+        24h, so lookups are O(1). Returns None if no timestamped data was seen.
+        """
+        if not self.counts.any():
+            return None
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profile = (self.sums / self.counts).reshape(DAYS_PER_WEEK, SLOTS_PER_DAY)
+
+        # Fill gaps from the same slot on other days, then the overall mean
+        slot_means = np.nanmean(profile, axis=0)
+        profile = np.where(np.isnan(profile), slot_means, profile)
+        profile = np.where(np.isnan(profile), self.sums.sum() / self.counts.sum(), profile)
+
+        peak_threshold = profile.mean(axis=1) + 0.5 * profile.std(axis=1)
+        baseline = np.percentile(profile, 10, axis=1)
+
+        # Lowest-load slot in the next 24h (wrapping across the week)
+        flat = profile.ravel()
+        window = (np.arange(flat.size)[:, None] + np.arange(1, SLOTS_PER_DAY + 1)[None, :]) % flat.size
+        best_shift = window[np.arange(flat.size), np.argmin(flat[window], axis=1)]
+
+        return {
+            'profile': profile.astype(np.float32),
+            'peak_threshold': peak_threshold.astype(np.float32),
+            'baseline': baseline.astype(np.float32),
+            'best_shift': best_shift.reshape(DAYS_PER_WEEK, SLOTS_PER_DAY).astype(np.int16),
+            'kw_per_unit': 0.001 if self.sums.sum() / self.counts.sum() > WATTS_MEAN_ABOVE else 1.0,
+        }
+
+
+def build_load_profile(df, power_col='Global_active_power'):
+    """Build the load profile from one in-memory frame (see LoadProfileAccumulator)"""
+    accumulator = LoadProfileAccumulator(power_col)
+    accumulator.add(df)
+    return accumulator.finalize()
+
+
+def peak_context(load_profile, when):
+    """
+    O(1) lookup of the user's typical load at `when`, in kW.
+    Returns None if `when` is not a peak slot for this user.
+    """
+    weekday, slot = slot_of(when)
+    expected = float(load_profile['profile'][weekday, slot])
+    if expected < float(load_profile['peak_threshold'][weekday]):
+        return None
+
+    kw = load_profile.get('kw_per_unit')
+    if kw is None:  # profiles saved before the unit was recorded
+        kw = 0.001 if float(load_profile['profile'].mean()) > WATTS_MEAN_ABOVE else 1.0
+    best = int(load_profile['best_shift'][weekday, slot])
+    best_weekday, best_slot = divmod(best, SLOTS_PER_DAY)
+    return {
+        'expected_load': expected * kw,
+        'shiftable_load': max(expected - float(load_profile['baseline'][weekday]), 0.0) * kw,
+        'shift_to': slot_label(best_slot),
+        'shift_to_load': float(load_profile['profile'][best_weekday, best_slot]) * kw,
+        'slot': slot_label(slot),
+    }
@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import wire_format
+from disaggregation import feature_frame
+from ml_engine import EnergyMLEngine, process_request
+from model_store import scratch_models_dir
+
+ENGINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_engine.py')
+SOURCE_FILES = {
+    'low': ('user_training_low.csv', 'Power'),
+    'medium': ('user_training_medium.csv', 'Power'),
+    'high': ('user_training_high.csv', 'Power'),
+    'commercial': ('user_training_commercial.csv', 'Power'),
+    'synthetic': ('synthetic_training_data.csv', 'Global_active_power'),
+}
+READING_SECONDS = 15 * 60
+WINDOW = 96          # readings per detect/analyze request (one day)
+HISTORY = 96 * 7     # records sent as historical_data with analyze
+ENGINE_TIMEOUT = 30  # same limit as the server's mlController
+DEFAULT_MIX = {'detect': 0.7, 'analyze': 0.2, 'ingest': 0.1}
+
+
+def load_sources(data_dir='.'):
+    """Power series and timestamps for each generated dataset"""
+    sources = {}
+    for name, (filename, power_col) in SOURCE_FILES.items():
+        df = pd.read_csv(os.path.join(data_dir, filename), usecols=['Date', 'Time', power_col])
+        timestamps = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M')
+        sources[name] = {
+            'power': df[power_col].to_numpy(dtype=np.float64),
+            'timestamps': timestamps.dt.strftime('%Y-%m-%dT%H:%M:%S').to_numpy(),
+        }
+    return sources
+
+
+def build_fleet(sources, n_households, steps, seed=42):
+    """
+    Households drawn round-robin from the sources, each with its own start
+    offset, consumption level and phase within the 15-minute interval.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(sources)
+    fleet = []
+    for i in range(n_households):
+        name = names[i % len(names)]
+        source = sources[name]
+        span = HISTORY + steps
+        start = int(rng.integers(0, max(len(source['power']) - span, 1)))
+        fleet.append({
+            'user_id': f"load_{i}",
+            'source': name,
+            'power': source['power'][start:start + span] * rng.uniform(0.8, 1.25),
+            'timestamps': source['timestamps'][start:start + span],
+            'phase': float(rng.uniform(0, 1)),
+        })
+    return fleet
+
+
+def prepare_models(fleet, sources, models_dir):
+    """
+    Train one model per source and copy it to each household, so the replay
+    measures serving rather than first-request training.
+    """
+    templates = {}
+    for name, source in sources.items():
+        engine = EnergyMLEngine(f"template_{name}", models_dir)
+        frame = feature_frame(source['power'])
+        frame['timestamp'] = pd.to_datetime(source['timestamps'])
+        engine._train_model(frame)
+        templates[name] = engine.model_dir
+    for household in fleet:
+        target = os.path.join(models_dir, f"user_{household['user_id']}")
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(templates[household['source']], target)
+
+
+def parse_mix(text):
+    """'detect=0.7,analyze=0.2,ingest=0.1' -> normalized weights"""
+    mix = {}
+    for part in text.split(','):
+        action, weight = part.split('=')
+        mix[action.strip()] = float(weight)
+    total = sum(mix.values())
+    return {action: weight / total for action, weight in mix.items()}
+
+
+def build_schedule(fleet, steps, speedup, mix, seed=42):
+    """
+    Open-loop schedule: every household produces one reading per simulated
+    15 minutes (compressed by `speedup`) and sends one request per reading.
+    Returns [(send_at_seconds, action, request)] sorted by time.
+    """
+    rng = np.random.default_rng(seed)
+    actions = list(mix)
+    interval = READING_SECONDS / speedup
+    events = []
+    for step in range(steps):
+        chosen = rng.choice(actions, size=len(fleet), p=[mix[a] for a in actions])
+        for household, action in zip(fleet, chosen):
+            now = HISTORY + step
+            power = household['power']
+            timestamps = household['timestamps']
+            request = {'user_id': household['user_id'], 'action': action}
+            if action == 'detect' or action == 'ensemble':
+                request['power_data'] = power[now - WINDOW:now + 1]
+                request['timestamps'] = timestamps[now - WINDOW:now + 1].tolist()
+                if action == 'ensemble':
+                    request.update({'action': 'detect', 'mode': 'ensemble'})
+            elif action == 'analyze':
+                request['power_data'] = power[now - WINDOW:now + 1]
+                request['historical_data'] = [{'Global_active_power': float(p)}
+                                              for p in power[now - HISTORY:now]]
+            elif action == 'ingest':
+                request['power_data'] = power[now:now + 1]
+                request['timestamps'] = timestamps[now:now + 1].tolist()
+            events.append(((step + household['phase']) * interval, action, request))
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def _spawned_call(request, wire, models_dir, env=None):
+    """One request the way the server sends it: a fresh ml_engine.py process"""
+    if wire == 'binary':
+        payload = wire_format.encode_frame(request)
+    else:
+        payload = json.dumps(request, default=wire_format.json_default).encode()
+    env = dict(env if env is not None else os.environ, WATTBUDDY_MODELS_DIR=models_dir)
+    completed = subprocess.run([sys.executable, ENGINE_PATH], input=payload,
+                               capture_output=True, timeout=ENGINE_TIMEOUT, env=env)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.decode(errors='replace')[-500:])
+    output = completed.stdout
+    result = wire_format.decode_frame(output) if wire_format.is_binary_frame(output) else json.loads(output)
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+
+
+def _resident_call(request, models_dir):
+    """One request in the current process (a long-lived worker)"""
+    result = process_request(request, models_dir)
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+
+
+def _rss_bytes():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def replay(events, mode, concurrency, wire, models_dir):
+    """Send the schedule with `concurrency` workers; returns per-request records and resource usage"""
+    records = []
+    lock = threading.Lock()
+    rss_samples = []
+    stop = threading.Event()
+
+    def sample_rss():
+        while not stop.wait(0.1):
+            rss_samples.append(_rss_bytes())
+
+    def run(send_at, action, request, origin):
+        started = time.perf_counter()
+        error = None
+        try:
+            if mode == 'spawned':
+                _spawned_call(request, wire, models_dir)
+            else:
+                _resident_call(request, models_dir)
+        except Exception as e:
+            error = str(e)
+        finished = time.perf_counter()
+        with lock:
+            records.append({
+                'action': action,
+                'service_ms': (finished - started) * 1000,
+                # Includes time waiting for a free worker behind the schedule
+                'latency_ms': (finished - origin - send_at) * 1000,
+                'error': error,
+            })
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    origin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for send_at, action, request in events:
+            delay = origin + send_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, send_at, action, request, origin)
+    wall = time.perf_counter() - origin
+    stop.set()
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    # Engine CPU: the spawned processes, or this process when resident
+    before, after = (children_before, children_after) if mode == 'spawned' else (self_before, self_after)
+    rss_samples = rss_samples or [_rss_bytes()]
+    usage = {
+        'wall_s': wall,
+        'cpu_s': (after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime),
+        # Spawned: largest single engine process (ru_maxrss is KiB on Linux);
+        # resident: this worker, sampled during the replay only
+        'peak_rss_bytes': children_after.ru_maxrss * 1024 if mode == 'spawned' else max(rss_samples),
+        'mean_rss_bytes': float(np.mean(rss_samples)),
+    }
+    return records, usage
+
+
+def summarize(records, usage):
+    """Latency percentiles per action and overall, throughput, CPU and RSS"""
+    def percentiles(rows):
+        ok = [r for r in rows if r['error'] is None]
+        summary = {'requests': len(rows), 'errors': len(rows) - len(ok)}
+        for field in ['latency_ms', 'service_ms']:
+            values = np.array([r[field] for r in ok]) if ok else np.zeros(1)
+            summary[field] = {f"p{q}": float(np.percentile(values, q)) for q in (50, 95, 99)}
+        return summary
+
+    report = {'overall': percentiles(records), 'actions': {}}
+    for action in sorted({r['action'] for r in records}):
+        report['actions'][action] = percentiles([r for r in records if r['action'] == action])
+    report['throughput_rps'] = len(records) / usage['wall_s'] if usage['wall_s'] else 0.0
+    report['cpu_s'] = usage['cpu_s']
+    report['cpu_cores_used'] = usage['cpu_s'] / usage['wall_s'] if usage['wall_s'] else 0.0
+    report['peak_rss_mb'] = usage['peak_rss_bytes'] / 1e6
+    report['mean_rss_mb'] = usage['mean_rss_bytes'] / 1e6
+    report['wall_s'] = usage['wall_s']
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay simulated fleet traffic against the ML engine')
+    parser.add_argument('--households', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=4, help='simulated 15-minute intervals to replay')
+    parser.add_argument('--speedup', type=float, default=900.0, help='simulated seconds per real second')
+    parser.add_argument('--mode', choices=['spawned', 'resident'], default='spawned')
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--mix', default=','.join(f"{a}={w}" for a, w in DEFAULT_MIX.items()),
+                        help='action weights, e.g. detect=0.6,analyze=0.2,ingest=0.1,ensemble=0.1')
+    parser.add_argument('--wire', choices=['json', 'binary'], default='json')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='optional JSON report path')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(os.path.dirname(__file__))
+    sources = load_sources(data_dir)
+    fleet = build_fleet(sources, args.households, args.steps, args.seed)
+    events = build_schedule(fleet, args.steps, args.speedup, parse_mix(args.mix), args.seed)
+
+    with scratch_models_dir('wattbuddy_load_') as models_dir:
+        print(f"🏠 Preparing models for {len(fleet)} households...")
+        prepare_models(fleet, sources, models_dir)
+        print(f"🚀 Replaying {len(events)} requests ({args.mode}, concurrency {args.concurrency})...")
+        records, usage = replay(events, args.mode, args.concurrency, args.wire, models_dir)
+
+    report = summarize(records, usage)
+    report['config'] = vars(args)
+
+    print("\n" + "="*60)
+    print(f"📊 LOAD TEST: {args.households} households x {args.steps} steps, {args.mode}")
+    print("="*60)
+    for name, row in [('all', report['overall'])] + list(report['actions'].items()):
+        lat = row['latency_ms']
+        print(f"{name:>9}: {row['requests']:>6} req, {row['errors']} err | "
+              f"p50 {lat['p50']:.1f} ms, p95 {lat['p95']:.1f} ms, p99 {lat['p99']:.1f} ms")
+    print(f"⚡ Throughput: {report['throughput_rps']:.1f} req/s over {report['wall_s']:.1f}s")
+    print(f"🖥  CPU: {report['cpu_s']:.1f}s ({report['cpu_cores_used']:.2f} cores)")
+    print(f"🧠 RSS: peak {report['peak_rss_mb']:.0f} MB, mean {report['mean_rss_mb']:.0f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report saved: {args.output}")
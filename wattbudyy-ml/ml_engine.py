@@ -1,27 +1,64 @@
 import json
+import resource_governor  # before NumPy: caps BLAS/OpenMP pools for this process
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
 import joblib
 import os
 from datetime import datetime, timedelta
 import sys
+import time
+import wire_format
+from result_cache import ResultCache
+from rollup import RollupStore
+from load_profile import LoadProfileAccumulator, build_load_profile, peak_context, reading_timestamps
+from disaggregation import ALL_DAY, SubMeterAccumulator, SubMeterModel, feature_frame, feature_matrix
+from drift import DRIFT_FILE, DriftMonitor, reference_histogram
+from model_store import MODELS_DIR, ModelStore
+from backfill import backfill
+from ensemble import EnsembleDetector
+from forest_compression import compress_forest
+from segmentation import calibration_path
+from streaming_train import DEFAULT_CHUNKSIZE, ISOLATION_TREE_SAMPLES, Reservoir, iter_chunks
+
+# Reads of the current version before falling back to an older one
+LOAD_ATTEMPTS = 3
+LOAD_RETRY_DELAY = 0.05  # seconds, grows with each attempt
+
+def _scale_inplace(scaler, X):
+    """StandardScaler.transform without the copy (X is float32, modified in place)"""
+    if scaler.mean_ is not None:
+        X -= scaler.mean_.astype(np.float32)
+    if scaler.scale_ is not None:
+        X /= scaler.scale_.astype(np.float32)
+    return X
+
 
 class EnergyMLEngine:
     """
     Adaptive ML engine for energy anomaly detection and pattern learning
     """
     
-    def __init__(self, user_id):
+    def __init__(self, user_id, models_dir=MODELS_DIR):
         self.user_id = user_id
-        self.model_dir = f"models/user_{user_id}"
+        self.models_dir = models_dir
+        self.model_dir = os.path.join(models_dir, f"user_{user_id}")
         self.ensure_model_dir()
+        self.store = ModelStore(self.model_dir)
+        self.version = None
         
         self.anomaly_model = None
         self.scaler = None
         self.pattern_model = None
+        self.load_profile = None
+        self.submeter_model = None
+        # Reference histogram of the training features and the live monitor against it
+        self.drift_reference = None
+        self.drift = None
+        # Segment-tier calibration (identity for per-user models)
+        self.power_scale = 1.0
+        self.score_offset = None
         self.feature_names = [
             'Global_active_power',
             'Global_intensity', 
@@ -38,14 +75,36 @@ class EnergyMLEngine:
             os.makedirs(self.model_dir, exist_ok=True)
     
     def load_or_train_model(self, training_data=None):
-        """Load pre-trained model or train from data"""
+        """Load pre-trained model or train from data (the default model only for users with no versions)"""
+        # Try to load the current published version (re-read the pointer once
+        # in case a concurrent publish garbage-collected the one we saw)
+        current = None
+        for attempt in range(LOAD_ATTEMPTS):
+            current = self.store.current_version()
+            if self._load_version(current):
+                return True
+            if current is None:
+                break
+            time.sleep(LOAD_RETRY_DELAY * (attempt + 1))
+        
+        # Current version unreadable (e.g. a truncated pickle): serve the newest
+        # older version rather than replacing the user's model with the default
+        published = self.store.versions()
+        for version in reversed(published):
+            if version != current and self._load_version(version):
+                print(f"Model version {current} unreadable, serving {version}", file=sys.stderr)
+                return True
+        if published:
+            print(f"No loadable model version for user {self.user_id}", file=sys.stderr)
+            return False
+        
+        # Pre-versioning layout: flat files in the model directory
         model_path = os.path.join(self.model_dir, 'anomaly_model.pkl')
         scaler_path = os.path.join(self.model_dir, 'scaler.pkl')
-        
-        # Try to load existing model
         if os.path.exists(model_path) and os.path.exists(scaler_path):
-            self.anomaly_model = joblib.load(model_path)
+            self.anomaly_model = resource_governor.limit_model_jobs(joblib.load(model_path))
             self.scaler = joblib.load(scaler_path)
+            self.version = 'legacy'
             return True
         
         # Train new model if data provided
@@ -57,97 +116,340 @@ class EnergyMLEngine:
     
     def _train_default_model(self):
         """Train model on default historical data"""
-        try:
-            df = pd.read_csv("kerala_energy_1year.csv")
-            return self._train_model(df)
-        except Exception as e:
-            print(f"Error training default model: {e}", file=sys.stderr)
-            return False
+        # Not this user's readings, so no load profile: suggestions use the generic peak alert
+        return self.train_streaming("kerala_energy_1year.csv", own_readings=False)
+    
+    def _new_anomaly_model(self):
+        return IsolationForest(
+            n_estimators=150,
+            contamination=0.05,
+            random_state=42,
+            max_samples='auto',
+            n_jobs=resource_governor.n_jobs()
+        )
     
     def _train_model(self, df):
         """Train Isolation Forest model on data"""
         try:
-            X = df[self.feature_names].fillna(0)
+            X = self._feature_matrix(df)
             
             # Normalize data
-            self.scaler = StandardScaler()
-            X_scaled = self.scaler.fit_transform(X)
+            self.scaler = StandardScaler().fit(X)
+            X_scaled = _scale_inplace(self.scaler, X)
             
             # Train anomaly detector
-            self.anomaly_model = IsolationForest(
-                n_estimators=150,
-                contamination=0.05,
-                random_state=42,
-                max_samples='auto',
-                n_jobs=-1
-            )
+            self.anomaly_model = self._new_anomaly_model()
             self.anomaly_model.fit(X_scaled)
+            self.anomaly_model = compress_forest(self.anomaly_model, X_scaled)
+            self.drift_reference = reference_histogram(X_scaled, self.feature_names)
+            
+            # Weekday x 15-min load profile for time-of-use suggestions
+            self.load_profile = build_load_profile(df)
             
-            # Save model
-            model_path = os.path.join(self.model_dir, 'anomaly_model.pkl')
-            scaler_path = os.path.join(self.model_dir, 'scaler.pkl')
-            joblib.dump(self.anomaly_model, model_path)
-            joblib.dump(self.scaler, scaler_path)
+            # Sub-meter estimates for live readings that only carry total power
+            self.submeter_model = SubMeterModel.fit(df)
             
+            self._save_model()
             return True
         except Exception as e:
             print(f"Error training model: {e}", file=sys.stderr)
             return False
     
-    def detect_anomalies(self, power_data):
+    def train_streaming(self, source, chunksize=DEFAULT_CHUNKSIZE, own_readings=True):
+        """
+        Train from a CSV path or iterable of DataFrame chunks in constant memory.
+        The scaler is fitted incrementally; the forest is fitted on a uniform
+        reservoir sample of n_estimators * 256 rows, from which each tree draws
+        its 256 rows, so it matches the in-memory fit in distribution (and
+        exactly when the history fits in the reservoir).
+        The load profile is only kept when the history is the user's own.
+        """
+        try:
+            model = self._new_anomaly_model()
+            scaler = StandardScaler()
+            reservoir = Reservoir(model.n_estimators * ISOLATION_TREE_SAMPLES, len(self.feature_names),
+                                  dtype=np.float32)
+            profile = LoadProfileAccumulator()
+            submeter = SubMeterAccumulator()
+            
+            for chunk in iter_chunks(source, chunksize):
+                X = self._feature_matrix(chunk)
+                scaler.partial_fit(X)
+                reservoir.add(X)
+                profile.add(chunk)
+                submeter.add(chunk)
+            
+            if reservoir.seen == 0:
+                raise ValueError('No training rows')
+            
+            X_sample = _scale_inplace(scaler, reservoir.sample())
+            model.fit(X_sample)
+            
+            self.scaler = scaler
+            self.anomaly_model = compress_forest(model, X_sample)
+            self.drift_reference = reference_histogram(X_sample, self.feature_names)
+            self.load_profile = profile.finalize() if own_readings else None
+            self.submeter_model = submeter.finalize()
+            self._save_model()
+            return True
+        except Exception as e:
+            print(f"Error training model: {e}", file=sys.stderr)
+            return False
+    
+    def _load_version(self, version):
+        """Load one immutable model version; False if it is missing"""
+        if version is None:
+            return False
+        try:
+            version, artifacts = self.store.load(version)
+        except Exception as e:
+            # Missing (garbage-collected) or unreadable (truncated, mid-write) files
+            print(f"Error loading model version {version}: {e}", file=sys.stderr)
+            return False
+        if 'anomaly_model' not in artifacts or 'scaler' not in artifacts:
+            return False
+        
+        self.anomaly_model = resource_governor.limit_model_jobs(artifacts['anomaly_model'])
+        self.scaler = artifacts['scaler']
+        self.load_profile = artifacts.get('load_profile')
+        self.submeter_model = artifacts.get('submeter_model')
+        self.drift_reference = artifacts.get('drift_reference')
+        self.version = version
+        self._open_drift_monitor()
+        return True
+    
+    def load_segment_model(self, segments_dir=None):
+        """
+        Use the shared model of the user's segment plus their calibration
+        (power scale and score threshold). False if the user has no segment.
+        """
+        segments_dir = segments_dir or os.path.join(self.models_dir, 'segments')
+        path = calibration_path(self.user_id, segments_dir)
+        if not os.path.exists(path):
+            return False
+        try:
+            calibration = joblib.load(path)
+            segment_model = ModelStore(segments_dir).load_artifact(
+                calibration['segment_version'], f"segment_{calibration['segment']}"
+            )
+        except Exception as e:
+            print(f"Error loading segment model: {e}", file=sys.stderr)
+            return False
+        
+        self.anomaly_model = resource_governor.limit_model_jobs(segment_model['anomaly_model'])
+        self.scaler = segment_model['scaler']
+        self.submeter_model = None
+        # Shared models are retrained fleet-wide, not per user
+        self.drift_reference = None
+        self.drift = None
+        self.power_scale = calibration['power_scale']
+        self.score_offset = calibration['score_offset']
+        self.version = (f"segment-{calibration['segment_version']}-{calibration['segment']}"
+                        f"-{self.power_scale:.6g}-{self.score_offset:.6g}")
+        return True
+    
+    def _anomaly_threshold(self):
+        """Scores below this are anomalies (IsolationForest.predict rule)"""
+        return self.score_offset if self.score_offset is not None else self.anomaly_model.offset_
+    
+    def reload_if_changed(self):
+        """For long-lived workers: reload only when a new version was published"""
+        current = self.store.current_version()
+        if current is None or current == self.version:
+            return False
+        return self._load_version(current)
+    
+    def _save_model(self):
+        """Publish model, scaler and the optional profile/sub-meter models as one version"""
+        self.version = self.store.publish({
+            'anomaly_model': self.anomaly_model,
+            'scaler': self.scaler,
+            'load_profile': self.load_profile,
+            'submeter_model': self.submeter_model,
+            'drift_reference': self.drift_reference,
+        })
+        self._open_drift_monitor()
+    
+    def _open_drift_monitor(self):
+        """Live drift state for the loaded version (None without a reference)"""
+        self.drift = None
+        if self.drift_reference is not None:
+            self.drift = DriftMonitor.load(os.path.join(self.model_dir, DRIFT_FILE),
+                                           self.drift_reference, self.version)
+    
+    def retrain_due(self, candidate=None):
+        """
+        Whether retraining is warranted: the live readings drifted from the
+        training reference, or the candidate training data (DataFrame) did.
+        Always True when the model has no reference to compare against.
+        """
+        if self.drift is None:
+            return True, None
+        status = self.drift.status()
+        if candidate is not None:
+            status['candidate'] = self.drift.compare(candidate, self.scaler, self.feature_names)
+            status['retrain_due'] = status['retrain_due'] or status['candidate']['drifted']
+        return status['retrain_due'], status
+    
+    def observe_drift(self, power_data, timestamps=None):
+        """Add a request's readings to the live drift histogram (each reading counts once)"""
+        if self.drift is None:
+            return
+        if isinstance(power_data, np.ndarray) or (
+                isinstance(power_data, list) and not (power_data and isinstance(power_data[0], dict))):
+            n = len(power_data)
+            values = {'Global_active_power': np.asarray(power_data, dtype=np.float64)}
+        else:
+            # Records or columns, as detect_anomalies takes them
+            frame = pd.DataFrame(power_data)
+            power_col = next((c for c in ['Global_active_power', 'Power', 'power'] if c in frame.columns), None)
+            if power_col is None:
+                return
+            n = len(frame)
+            values = {'Global_active_power': frame[power_col].to_numpy(dtype=np.float64)}
+            if timestamps is None:
+                timestamps = reading_timestamps(frame)
+        if timestamps is not None and len(timestamps) != n:
+            timestamps = None
+        self.drift.observe(values, self.scaler, self.feature_names, self.power_scale, timestamps)
+    
+    def model_version(self):
+        """Identify the loaded model (changes whenever it is retrained)"""
+        return self.version or self.store.current_version() or 'unsaved'
+    
+    def _power_features(self, power, slots=None):
+        """Derive the model's feature frame from a bare power series"""
+        return feature_frame(power, self.submeter_model, slots)
+    
+    def _feature_matrix(self, df):
+        """float32 features in model order, copied column by column (no frame copies)"""
+        X = np.empty((len(df), len(self.feature_names)), dtype=np.float32)
+        for i, col in enumerate(self.feature_names):
+            X[:, i] = df[col].to_numpy(dtype=np.float32, na_value=0)
+        return X
+    
+    def _score_matrix(self, X):
+        """Normalize (in place) and score a float32 feature matrix"""
+        X[np.isnan(X)] = 0
+        if self.power_scale != 1.0:
+            # Segment models see every user at the segment's consumption level
+            for i, col in enumerate(self.feature_names):
+                if col != 'Voltage':
+                    X[:, i] *= self.power_scale
+        return self.anomaly_model.score_samples(_scale_inplace(self.scaler, X))
+    
+    def _score_frame(self, df):
+        """Normalize and score a feature frame"""
+        return self._score_matrix(self._feature_matrix(df))
+    
+    def score_dataset(self, df, power_col='Global_active_power'):
+        """
+        Score a whole dataset with the persisted model (no refit).
+        Uses the real features when present, else derives them from power.
+        Returns (scores, anomaly flags).
+        """
+        if not self.anomaly_model or not self.scaler:
+            self.load_or_train_model()
+        
+        if all(c in df.columns for c in self.feature_names):
+            scores = self._score_frame(df)
+        else:
+            timestamps = reading_timestamps(df)
+            slots = None
+            if timestamps is not None:
+                # Per row, so scoring a series in chunks matches scoring it whole
+                slots = (timestamps.dt.hour * 4 + timestamps.dt.minute // 15).fillna(ALL_DAY).to_numpy(dtype=np.int64)
+            scores = self._score_matrix(feature_matrix(df[power_col].to_numpy(), self.submeter_model, slots))
+        return scores, scores < self._anomaly_threshold()
+    
+    def detect_anomalies(self, power_data, cache=None, timestamps=None):
         """
         Detect anomalies in power consumption data
         Returns: {anomalies, scores, severity}
+        If a ResultCache is given, per-point scores are reused across calls.
+        Optional reading timestamps give the sub-meter estimates time of day.
         """
         if not self.anomaly_model or not self.scaler:
             self.load_or_train_model()
         
         try:
-            # Convert to DataFrame
-            if isinstance(power_data, list):
-                df = pd.DataFrame({
-                    'Global_active_power': power_data,
-                    'Global_intensity': [x * 0.5 for x in power_data],
-                    'Voltage': [230] * len(power_data),
-                    'Sub_metering_1': [x * 0.3 for x in power_data],
-                    'Sub_metering_2': [x * 0.3 for x in power_data],
-                    'Sub_metering_3': [x * 0.2 for x in power_data],
-                    'Sub_metering_4': [x * 0.2 for x in power_data],
-                })
+            if isinstance(power_data, (list, np.ndarray)):
+                if timestamps is not None and len(timestamps) == len(power_data):
+                    # Features depend on the slot, so per-value memoization does not apply
+                    ts = pd.DatetimeIndex(pd.to_datetime(timestamps))
+                    slots = ts.hour * 4 + ts.minute // 15
+                    scores = self._score_matrix(feature_matrix(power_data, self.submeter_model, slots))
+                elif cache is not None:
+                    scores = cache.cached_scores(
+                        self.model_version(), power_data,
+                        lambda values: self._score_matrix(feature_matrix(values, self.submeter_model))
+                    )
+                else:
+                    scores = self._score_matrix(feature_matrix(power_data, self.submeter_model))
             else:
-                df = pd.DataFrame(power_data)
-            
-            # Normalize
-            X_scaled = self.scaler.transform(df.fillna(0))
-            
-            # Predict
-            predictions = self.anomaly_model.predict(X_scaled)
-            scores = self.anomaly_model.score_samples(X_scaled)
+                power_data = pd.DataFrame(power_data)
+                scores = self._score_frame(power_data)
             
-            # Convert predictions (-1 = anomaly, 1 = normal)
-            anomalies = [1 if x == -1 else 0 for x in predictions]
+            # Same rule as IsolationForest.predict, without a second pass over the forest
+            anomalies = (scores < self._anomaly_threshold()).astype(np.int8)
             
             # Calculate severity (0-100)
             severity = self._calculate_severity(scores, anomalies)
             
+            # Arrays stay as NumPy; the output encoder decides JSON vs binary
             return {
                 'anomalies': anomalies,
-                'scores': scores.tolist(),
+                'scores': scores,
                 'severity': severity,
-                'is_anomaly': any(a == 1 for a in anomalies),
+                'is_anomaly': bool(anomalies.any()),
             }
         except Exception as e:
             print(f"Error detecting anomalies: {e}", file=sys.stderr)
             return {'error': str(e)}
     
+    def detect_ensemble(self, power_data, timestamps=None, weights=None, mode='weighted',
+                        threshold=0.5, latency_budget_ms=None):
+        """
+        Detect anomalies with IsolationForest, RandomForest and KNN together
+        Returns the detect_anomalies fields plus which members were used;
+        scores are blended anomaly probabilities (higher = more anomalous)
+        """
+        if not self.anomaly_model or not self.scaler:
+            self.load_or_train_model()
+        
+        try:
+            if isinstance(power_data, (list, np.ndarray)):
+                slots = None
+                if timestamps is not None and len(timestamps) == len(power_data):
+                    ts = pd.DatetimeIndex(pd.to_datetime(timestamps))
+                    slots = ts.hour * 4 + ts.minute // 15
+                df = self._power_features(power_data, slots)
+            else:
+                df = pd.DataFrame(power_data)
+            
+            detector = EnsembleDetector(self, weights=weights, mode=mode, threshold=threshold,
+                                        latency_budget_ms=latency_budget_ms)
+            probabilities, anomalies, info = detector.score(df)
+            flagged = probabilities[anomalies == 1]
+            
+            return {
+                'anomalies': anomalies,
+                'scores': probabilities,
+                'severity': int(flagged.mean() * 100) if len(flagged) else 0,
+                'is_anomaly': bool(anomalies.any()),
+                'ensemble': info,
+            }
+        except Exception as e:
+            print(f"Error in ensemble detection: {e}", file=sys.stderr)
+            return {'error': str(e)}
+    
     def _calculate_severity(self, scores, anomalies):
         """Calculate severity of anomalies (0-100)"""
         try:
-            anomaly_indices = [i for i, a in enumerate(anomalies) if a == 1]
-            if not anomaly_indices:
+            anomaly_scores = scores[np.asarray(anomalies) == 1]
+            if len(anomaly_scores) == 0:
                 return 0
             
-            anomaly_scores = [scores[i] for i in anomaly_indices]
             # Normalize scores to 0-100
             min_score = np.min(scores)
             max_score = np.max(scores)
@@ -155,9 +457,7 @@ class EnergyMLEngine:
             if max_score == min_score:
                 return 50
             
-            normalized = [(s - min_score) / (max_score - min_score) * 100 
-                         for s in anomaly_scores]
-            return int(np.mean(normalized))
+            return int(np.mean((anomaly_scores - min_score) / (max_score - min_score) * 100))
         except:
             return 50
     
@@ -167,22 +467,43 @@ class EnergyMLEngine:
         Returns pattern statistics
         """
         try:
-            df = pd.DataFrame(historical_data)
+            if isinstance(historical_data, np.ndarray):
+                # Binary requests send history as a bare power series
+                power = historical_data
+            elif len(historical_data) == 0:
+                return {}
+            elif not isinstance(historical_data[0], dict):
+                # JSON requests can send the same bare series (getInsights sends powerData)
+                power = np.asarray(historical_data, dtype=np.float32)
+            else:
+                # Only the power column is needed; skip building a DataFrame
+                if not any('Global_active_power' in row for row in historical_data):
+                    return {key: 0 for key in ['average_usage', 'peak_usage', 'min_usage', 'std_dev', 'variance']}
+                power = np.fromiter(
+                    (np.nan if row.get('Global_active_power') is None else row['Global_active_power']
+                     for row in historical_data),
+                    dtype=np.float32, count=len(historical_data)
+                )
             
-            if df.empty:
+            if len(power) == 0:
                 return {}
             
+            # float32 storage, float64 accumulation (NaN-skipping like pandas)
             return {
-                'average_usage': float(df['Global_active_power'].mean()) if 'Global_active_power' in df else 0,
-                'peak_usage': float(df['Global_active_power'].max()) if 'Global_active_power' in df else 0,
-                'min_usage': float(df['Global_active_power'].min()) if 'Global_active_power' in df else 0,
-                'std_dev': float(df['Global_active_power'].std()) if 'Global_active_power' in df else 0,
-                'variance': float(df['Global_active_power'].var()) if 'Global_active_power' in df else 0,
+                'average_usage': float(np.nanmean(power, dtype=np.float64)),
+                'peak_usage': float(np.nanmax(power)),
+                'min_usage': float(np.nanmin(power)),
+                'std_dev': float(np.nanstd(power, dtype=np.float64, ddof=1)),
+                'variance': float(np.nanvar(power, dtype=np.float64, ddof=1)),
             }
         except Exception as e:
             print(f"Error calculating pattern: {e}", file=sys.stderr)
             return {}
     
+    def load_rollups(self):
+        """Load the user's 15-min/hourly/daily/monthly aggregates"""
+        return RollupStore.load(os.path.join(self.model_dir, 'rollups.pkl'))
+    
     def generate_suggestions(self, current_usage, pattern, anomaly_data):
         """
         Generate personalized energy-saving suggestions
@@ -217,8 +538,20 @@ class EnergyMLEngine:
                 })
             
             # Time-based suggestions
-            current_hour = datetime.now().hour
-            if current_hour >= 18 and current_hour <= 22:  # Peak hours
+            now = datetime.now()
+            if self.load_profile is not None:
+                # User's own peak slots from the trained load profile
+                peak = peak_context(self.load_profile, now)
+                if peak:
+                    share = peak['shiftable_load'] / peak['expected_load'] if peak['expected_load'] else 0
+                    suggestions.append({
+                        'title': 'Peak Hours Alert',
+                        'message': f'{peak["slot"]} is one of your peak slots (typically {peak["expected_load"]:.1f} kW)',
+                        'action': f'Shift about {peak["shiftable_load"]:.1f} kW of flexible load to around {peak["shift_to"]}',
+                        'priority': 'medium',
+                        'savings_potential': int(min(share, 1.0) * 30),
+                    })
+            elif now.hour >= 18 and now.hour <= 22:  # Peak hours
                 suggestions.append({
                     'title': 'Peak Hours Alert',
                     'message': 'You\'re currently in peak electricity pricing hours',
@@ -247,27 +580,105 @@ class EnergyMLEngine:
             return []
 
 
-def process_request(request_data):
+def _cached_detect(engine, cache, power_data, timestamps=None, ensemble=None):
+    """Run detect_anomalies (or the ensemble) through the result cache"""
+    key = cache.make_key(engine.user_id, engine.model_version(), 'detect', power_data, timestamps, ensemble)
+    result = cache.get(key)
+    if result is None:
+        if ensemble is not None:
+            result = engine.detect_ensemble(power_data, timestamps, **ensemble)
+        else:
+            result = engine.detect_anomalies(power_data, cache=cache, timestamps=timestamps)
+        if 'error' not in result:
+            cache.put(key, result)
+    if 'error' not in result:
+        # Hits too: a repeated window may still hold readings the monitor has not seen
+        try:
+            engine.observe_drift(power_data, timestamps)
+        except Exception as e:
+            # Monitoring must never cost the caller its scores
+            print(f"Error observing drift: {e}", file=sys.stderr)
+    return result
+
+
+def _with_drift(engine, result):
+    """Persist the live drift histogram and report its status with the result"""
+    if engine.drift is None or 'error' in result:
+        return result
+    engine.drift.save()
+    return dict(result, drift=engine.drift.status())
+
+
+def _ensemble_options(request_data):
+    """Ensemble settings from a request, or None for single-model detection"""
+    if request_data.get('mode') != 'ensemble':
+        return None
+    options = request_data.get('ensemble') or {}
+    return {
+        'weights': options.get('weights'),
+        'mode': options.get('blend', 'weighted'),
+        'threshold': options.get('threshold', 0.5),
+        'latency_budget_ms': options.get('latency_budget_ms'),
+    }
+
+
+def process_request(request_data, models_dir=MODELS_DIR):
     """Main entry point for ML engine"""
+    # Detect-type actions run with few threads; train/backfill get the background share
+    try:
+        with resource_governor.role(resource_governor.role_for_action(request_data.get('action', 'detect'))):
+            return _handle_request(request_data, models_dir)
+    except resource_governor.SlotBusy as e:
+        # Backfill resumes from its checkpoint, so the caller just retries
+        return {'error': str(e), 'busy': True}
+
+
+def _handle_request(request_data, models_dir=MODELS_DIR):
     user_id = request_data.get('user_id', 'default')
     action = request_data.get('action', 'detect')
     
-    engine = EnergyMLEngine(user_id)
+    engine = EnergyMLEngine(user_id, models_dir)
+    
+    # 'segment' tier: shared segment model + per-user calibration when available
+    if request_data.get('model_tier') == 'segment' and action in ('detect', 'analyze', 'backfill'):
+        engine.load_segment_model()
     
     if action == 'detect':
         power_data = request_data.get('power_data', [])
-        engine.load_or_train_model()
-        return engine.detect_anomalies(power_data)
+        if not engine.anomaly_model:
+            engine.load_or_train_model()
+        cache = ResultCache.load(os.path.join(engine.model_dir, 'result_cache.pkl'))
+        result = _cached_detect(engine, cache, power_data, request_data.get('timestamps'),
+                                _ensemble_options(request_data))
+        cache.save()
+        return _with_drift(engine, result)
     
     elif action == 'analyze':
         power_data = request_data.get('power_data', [])
         historical_data = request_data.get('historical_data', [])
         
-        engine.load_or_train_model()
-        anomaly_data = engine.detect_anomalies(power_data)
-        pattern = engine.get_usage_pattern(historical_data)
+        if not engine.anomaly_model:
+            engine.load_or_train_model()
+        cache = ResultCache.load(os.path.join(engine.model_dir, 'result_cache.pkl'))
+        anomaly_data = _with_drift(engine, _cached_detect(engine, cache, power_data, request_data.get('timestamps'),
+                                                          _ensemble_options(request_data)))
+        
+        if 'history_range' in request_data:
+            # Answer from incremental rollups instead of raw readings
+            history_range = request_data['history_range'] or {}
+            pattern = engine.load_rollups().usage_pattern(
+                history_range.get('start'), history_range.get('end')
+            )
+        else:
+            pattern_key = cache.make_key(user_id, 'pattern', historical_data)
+            pattern = cache.get(pattern_key)
+            if pattern is None:
+                pattern = engine.get_usage_pattern(historical_data)
+                cache.put(pattern_key, pattern)
+        cache.save()
+        
         suggestions = engine.generate_suggestions(
-            current_usage=power_data[0] if power_data else 0,
+            current_usage=float(power_data[0]) if len(power_data) else 0,
             pattern=pattern,
             anomaly_data=anomaly_data
         )
@@ -278,21 +689,85 @@ def process_request(request_data):
             'suggestions': suggestions,
         }
     
+    elif action == 'ingest':
+        # Merge new timestamped readings into the user's rollups
+        timestamps = request_data.get('timestamps', [])
+        power_data = request_data.get('power_data', [])
+        if len(timestamps) != len(power_data):
+            return {'error': 'timestamps and power_data must have the same length'}
+        rollups = engine.load_rollups()
+        added = rollups.add(timestamps, power_data)
+        rollups.save()
+        return {'success': True, 'ingested': added, 'skipped': len(power_data) - added}
+    
     elif action == 'train':
         # Retrain model with new data
         training_data = request_data.get('training_data', [])
+        training_path = request_data.get('training_path')
+        
+        # Drift-gated: keep the current model unless the readings (or the new
+        # training data) moved away from what it was trained on; 'force' skips the check
+        if not request_data.get('force') and engine._load_version(engine.store.current_version()):
+            candidate = pd.DataFrame(training_data) if training_data else None
+            try:
+                due, status = engine.retrain_due(candidate)
+            except ValueError as e:
+                return {'error': str(e)}
+            if not due:
+                return {'success': True, 'skipped': True, 'message': 'No drift detected; model kept',
+                        'drift': status}
+        
+        if training_path:
+            # Large histories: stream from disk instead of passing rows over stdin
+            if engine.train_streaming(training_path, request_data.get('chunksize', DEFAULT_CHUNKSIZE)):
+                return {'success': True, 'message': 'Model retrained'}
+            return {'error': 'Training failed'}
         if training_data:
             engine._train_model(pd.DataFrame(training_data))
             return {'success': True, 'message': 'Model retrained'}
         return {'error': 'No training data provided'}
     
+    elif action == 'backfill':
+        # Long histories: score from disk in chunks, resuming from the last checkpoint;
+        # call again until 'complete' (each call stays within max_seconds)
+        input_path = request_data.get('input_path')
+        output_path = request_data.get('output_path')
+        if not input_path or not output_path:
+            return {'error': 'input_path and output_path are required'}
+        try:
+            return backfill(
+                engine, input_path, output_path,
+                chunksize=request_data.get('chunksize', DEFAULT_CHUNKSIZE),
+                power_col=request_data.get('power_col'),
+                max_seconds=request_data.get('max_seconds', 20),
+                restart=request_data.get('restart', False),
+            )
+        except (OSError, ValueError) as e:
+            print(f"Error in backfill: {e}", file=sys.stderr)
+            return {'error': str(e)}
+    
     return {'error': 'Unknown action'}
 
 
 if __name__ == '__main__':
-    # Read input from stdin
-    input_data = sys.stdin.read()
-    request = json.loads(input_data)
+    # Read input from stdin (JSON or WBF1 binary frame)
+    input_data = sys.stdin.buffer.read()
+    binary = wire_format.is_binary_frame(input_data)
+    request = wire_format.decode_frame(input_data) if binary else json.loads(input_data)
     
+    # Spawned per request, so background work can simply lower this process's priority
+    if resource_governor.role_for_action(request.get('action', 'detect')) != 'detect':
+        resource_governor.lower_priority()
     result = process_request(request)
-    print(json.dumps(result, default=str))
+    
+    if binary:
+        sys.stdout.buffer.write(wire_format.encode_frame(result))
+    else:
+        print(json.dumps(result, default=wire_format.json_default))
+    
+    # Everything is persisted by now. Exit without joining worker threads, so an
+    # ensemble member left over its latency budget can't hold the process (and
+    # the server, which waits for 'close') past the response.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)
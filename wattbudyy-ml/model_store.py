@@ -0,0 +1,117 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import joblib
+
+from atomic_file import atomic_path
+
+MODELS_DIR = os.environ.get('WATTBUDDY_MODELS_DIR', 'models')  # root of every user's model directory
+POINTER = 'current'
+VERSIONS_DIR = 'versions'
+DEFAULT_KEEP = 3
+
+
+@contextmanager
+def scratch_models_dir(prefix='wattbuddy_'):
+    """Throwaway models root for benchmarks and load tests, removed afterwards"""
+    path = tempfile.mkdtemp(prefix=prefix)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class ModelStore:
+    """
+    Versioned model artifacts for one user:
+
+        models/user_<id>/versions/<version>/<artifact>.pkl   (immutable)
+        models/user_<id>/current                             (text file: version id)
+
+    A version directory is fully written under a temp name and renamed into
+    place before `current` is atomically replaced, so readers always see a
+    complete, consistent set of artifacts.
+    """
+
+    def __init__(self, model_dir, keep=DEFAULT_KEEP):
+        self.model_dir = model_dir
+        self.keep = keep
+        self.versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+        self.pointer_path = os.path.join(model_dir, POINTER)
+
+    def current_version(self):
+        """Cheap check (one small file read); None if nothing published yet"""
+        try:
+            with open(self.pointer_path) as f:
+                version = f.read().strip()
+            return version or None
+        except OSError:
+            return None
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def publish(self, artifacts):
+        """Write artifacts as a new version, then swap `current` to it"""
+        os.makedirs(self.versions_dir, exist_ok=True)
+        version = f"v{time.time_ns()}-{os.getpid()}"
+        tmp_dir = os.path.join(self.versions_dir, f".{version}.tmp")
+
+        os.makedirs(tmp_dir)
+        try:
+            for name, obj in artifacts.items():
+                if obj is not None:
+                    joblib.dump(obj, os.path.join(tmp_dir, f"{name}.pkl"))
+            os.rename(tmp_dir, self.version_dir(version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        with atomic_path(self.pointer_path) as tmp_pointer:
+            with open(tmp_pointer, 'w') as f:
+                f.write(version)
+                f.flush()
+                os.fsync(f.fileno())
+
+        self.gc()
+        return version
+
+    def load(self, version=None):
+        """Load all artifacts of a version (default: current) -> (version, {name: obj})"""
+        version = version or self.current_version()
+        if version is None:
+            return None, {}
+
+        path = self.version_dir(version)
+        artifacts = {}
+        for filename in os.listdir(path):
+            if filename.endswith('.pkl'):
+                artifacts[filename[:-4]] = joblib.load(os.path.join(path, filename))
+        return version, artifacts
+
+    def load_artifact(self, version, name):
+        """Load a single artifact without touching the rest of the version"""
+        return joblib.load(os.path.join(self.version_dir(version), f"{name}.pkl"))
+
+    def versions(self):
+        """Published versions, oldest first"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        names = [n for n in os.listdir(self.versions_dir) if n.startswith('v')]
+        return sorted(names, key=lambda n: int(n[1:].split('-')[0]))
+
+    def gc(self):
+        """Remove all but the newest `keep` versions (never the current one)"""
+        current = self.current_version()
+        stale = self.versions()[:-self.keep] if self.keep > 0 else self.versions()
+        for version in stale:
+            if version == current:
+                continue
+            try:
+                shutil.rmtree(self.version_dir(version))
+            except OSError as e:
+                print(f"Could not remove old model version {version}: {e}", file=sys.stderr)
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from threadpoolctl import threadpool_limits
+
+try:
+    import fcntl
+except ImportError:  # not on Linux/macOS: no cross-process train slots
+    fcntl = None
+
+THREAD_ENV_VARS = [
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+]
+ENABLED = os.environ.get('WATTBUDDY_GOVERNOR', 'on').lower() not in ('off', '0', 'false')
+CORE_BUDGET = max(1, int(os.environ.get('WATTBUDDY_CORE_BUDGET', os.cpu_count() or 1)))
+DETECT_THREADS = max(1, int(os.environ.get('WATTBUDDY_DETECT_THREADS', 1)))
+DETECT_RESERVED = int(os.environ.get('WATTBUDDY_DETECT_RESERVED', max(1, CORE_BUDGET // 4)))
+TRAIN_SLOTS = max(1, int(os.environ.get('WATTBUDDY_TRAIN_SLOTS', 1)))
+BACKFILL_SLOTS = max(1, int(os.environ.get('WATTBUDDY_BACKFILL_SLOTS', 1)))
+LOCK_DIR = os.environ.get('WATTBUDDY_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'wattbuddy_train_slots'))
+BACKGROUND_ROLES = ('train', 'backfill')
+
+# One core budget per box, split by role:
+#   detect - latency-critical, WATTBUDDY_DETECT_THREADS each so many run side by side
+#   train  - background, the budget minus WATTBUDDY_DETECT_RESERVED cores, split
+#            across WATTBUDDY_TRAIN_SLOTS concurrent trainers (held with lock files)
+#   backfill - train-sized threads on its own WATTBUDDY_BACKFILL_SLOTS lock files;
+#              fails fast when they are busy (the caller retries, backfill resumes)
+# WATTBUDDY_GOVERNOR=off restores the old behaviour (all cores everywhere).
+# Import this module before NumPy so BLAS/OpenMP pools start at detect size.
+
+# Values before this module touched them, so child processes can opt out
+ORIGINAL_ENV = {var: os.environ.get(var) for var in THREAD_ENV_VARS + ['LOKY_MAX_CPU_COUNT']}
+
+
+def threads_for(role):
+    """Thread count for a role ('detect', 'train' or 'backfill'); -1 (all cores) when disabled"""
+    if not ENABLED:
+        return -1
+    if role in BACKGROUND_ROLES:
+        return max(1, (CORE_BUDGET - min(DETECT_RESERVED, CORE_BUDGET - 1)) // TRAIN_SLOTS)
+    return min(DETECT_THREADS, CORE_BUDGET)
+
+
+# Per thread, so a request served on one thread never sees another's role
+_local = threading.local()
+
+
+def current_role():
+    return getattr(_local, 'role', 'detect')
+
+
+def n_jobs():
+    """n_jobs for estimators built under the current role"""
+    return threads_for(current_role())
+
+
+def limit_model_jobs(model, jobs=None):
+    """Cap a loaded estimator's n_jobs (pickles keep the n_jobs they were fitted with)"""
+    if ENABLED and model is not None and hasattr(model, 'n_jobs'):
+        model.n_jobs = jobs if jobs is not None else n_jobs()
+    return model
+
+
+def role_for_action(action):
+    return action if action in BACKGROUND_ROLES else 'detect'
+
+
+def _init_process():
+    """Start BLAS/OpenMP pools at detect size; explicit settings always win"""
+    if not ENABLED:
+        return
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(threads_for('detect')))
+    # joblib/loky worker count never exceeds the budget
+    os.environ.setdefault('LOKY_MAX_CPU_COUNT', str(CORE_BUDGET))
+
+
+class SlotBusy(RuntimeError):
+    """All slots for a role are held and the role does not wait for one"""
+
+
+@contextmanager
+def _slot(name, slots, wait=True):
+    """Hold one of `slots` lock files so at most that many `name` jobs run at once"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    prefix = 'slot' if name == 'train' else f"{name}_slot"
+    handles = [open(os.path.join(LOCK_DIR, f"{prefix}_{i}.lock"), 'w') for i in range(slots)]
+    held = None
+    try:
+        for handle in handles:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                held = handle
+                break
+            except OSError:
+                continue
+        if held is None:
+            if not wait:
+                raise SlotBusy(f"all {slots} {name} slot(s) busy, retry later")
+            # All slots busy: queue on one of them
+            held = handles[os.getpid() % slots]
+            fcntl.flock(held, fcntl.LOCK_EX)
+        yield
+    finally:
+        if held is not None:
+            fcntl.flock(held, fcntl.LOCK_UN)
+        for handle in handles:
+            handle.close()
+
+
+@contextmanager
+def role(name):
+    """
+    Run a block under a role's thread limits and, for background roles, a
+    slot: 'train' queues for one, 'backfill' raises SlotBusy instead of
+    waiting. The role is per thread; BLAS/OpenMP limits are per process.
+    """
+    if not ENABLED:
+        yield threads_for(name)
+        return
+
+    previous, _local.role = current_role(), name
+    limit = threads_for(name)
+    try:
+        with threadpool_limits(limits=limit):
+            if name == 'train':
+                with _slot('train', TRAIN_SLOTS):
+                    yield limit
+            elif name == 'backfill':
+                with _slot('backfill', BACKFILL_SLOTS, wait=False):
+                    yield limit
+            else:
+                yield limit
+    finally:
+        _local.role = previous
+
+
+def lower_priority(increment=10):
+    """Background work yields the CPU to detects (only for short-lived processes)"""
+    if ENABLED and hasattr(os, 'nice'):
+        try:
+            os.nice(increment)
+        except OSError:
+            pass
+
+
+def child_env(enabled=True):
+    """Environment for a spawned engine, with or without the governor"""
+    env = dict(os.environ)
+    if not enabled:
+        for var, value in ORIGINAL_ENV.items():
+            if value is None:
+                env.pop(var, None)
+            else:
+                env[var] = value
+    env['WATTBUDDY_GOVERNOR'] = 'on' if enabled else 'off'
+    return env
+
+
+_init_process()
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+
+from atomic_file import atomic_dump
+
+
+class ResultCache:
+    """
+    Content-addressed cache for ml_engine results.
+    Whole results are keyed by user, model version and a hash of the inputs
+    (TTL + size-bounded LRU). Per-point anomaly scores are memoized per model
+    version so overlapping windows only score readings not seen before.
+    """
+
+    def __init__(self, path=None, max_entries=128, ttl_seconds=300, max_points=50000):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_points = max_points
+
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._memo_version = None
+        self._memo_values = np.empty(0, dtype=np.float64)
+        self._memo_scores = np.empty(0, dtype=np.float64)
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False  # only entries/memo changes need a rewrite; hits don't
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Load a persisted cache, starting empty if missing or unreadable"""
+        cache = cls(path=path, **kwargs)
+        if path and os.path.exists(path):
+            try:
+                state = joblib.load(path)
+                cache._entries = state.get('entries', OrderedDict())
+                cache._memo_version = state.get('memo_version')
+                cache._memo_values = state.get('memo_values', cache._memo_values)
+                cache._memo_scores = state.get('memo_scores', cache._memo_scores)
+                cache._evict()
+            except Exception as e:
+                print(f"Ignoring unreadable result cache: {e}", file=sys.stderr)
+        return cache
+
+    def save(self):
+        """Persist atomically (write temp file, then rename) if anything changed"""
+        if not self.path or not self._dirty:
+            return
+        try:
+            atomic_dump({
+                'entries': self._entries,
+                'memo_version': self._memo_version,
+                'memo_values': self._memo_values,
+                'memo_scores': self._memo_scores,
+            }, self.path)
+            self._dirty = False
+        except Exception as e:
+            print(f"Error saving result cache: {e}", file=sys.stderr)
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash request parts; numeric sequences are hashed as raw float64 bytes"""
+        digest = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, (list, tuple, np.ndarray)):
+                try:
+                    arr = np.ascontiguousarray(part, dtype=np.float64)
+                    digest.update(b'a%d:' % arr.shape[0])
+                    digest.update(arr.tobytes())
+                    continue
+                except (TypeError, ValueError):
+                    pass
+            digest.update(b'j:')
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return a cached value or None if missing/expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, value = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        self._dirty = True
+        self._evict()
+
+    def _evict(self):
+        now = time.time()
+        expired = [k for k, (stored_at, _) in self._entries.items()
+                   if now - stored_at > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def cached_scores(self, model_version, values, score_fn):
+        """
+        Score a 1-D power series, reusing memoized per-point scores.
+        score_fn(unique_values) is only called for values not scored before
+        under this model version.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if self._memo_version != model_version:
+            self._memo_version = model_version
+            self._dirty = True
+            self._memo_values = np.empty(0, dtype=np.float64)
+            self._memo_scores = np.empty(0, dtype=np.float64)
+
+        unique, inverse = np.unique(values, return_inverse=True)
+        scores = np.empty(len(unique), dtype=np.float64)
+        known = np.zeros(len(unique), dtype=bool)
+
+        if len(self._memo_values):
+            order = np.argsort(self._memo_values)
+            sorted_values = self._memo_values[order]
+            idx = np.minimum(np.searchsorted(sorted_values, unique), len(sorted_values) - 1)
+            known = sorted_values[idx] == unique
+            scores[known] = self._memo_scores[order[idx[known]]]
+
+        if not known.all():
+            missing = ~known
+            scores[missing] = score_fn(unique[missing])
+            self._remember(unique[missing], scores[missing])
+
+        return scores[inverse]
+
+    def _remember(self, values, scores):
+        finite = np.isfinite(values)
+        self._dirty = True
+        self._memo_values = np.concatenate([self._memo_values, values[finite]])[-self.max_points:]
+        self._memo_scores = np.concatenate([self._memo_scores, scores[finite]])[-self.max_points:]
@@ -0,0 +1,223 @@
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from atomic_file import atomic_dump
+
+# Rollup levels, finest first. Each bucket keeps sum, count, min, max, sum of squares.
+LEVELS = ['15min', 'hour', 'day', 'month']
+SUM, COUNT, MIN, MAX, SUMSQ = range(5)
+
+
+def _to_naive(ts):
+    """Normalize timestamps to tz-naive UTC so bucket keys are comparable"""
+    if getattr(ts, 'tz', None) is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts
+
+
+def _floor(index, level):
+    """Floor a DatetimeIndex to bucket starts for a level"""
+    if level == '15min':
+        return index.floor('15min')
+    if level == 'hour':
+        return index.floor('h')
+    if level == 'day':
+        return index.floor('D')
+    return index.to_period('M').to_timestamp()
+
+
+def _next_boundary(ts, level):
+    """Start of the bucket after the one containing ts"""
+    if level == '15min':
+        return ts.floor('15min') + pd.Timedelta(minutes=15)
+    if level == 'hour':
+        return ts.floor('h') + pd.Timedelta(hours=1)
+    if level == 'day':
+        return ts.floor('D') + pd.Timedelta(days=1)
+    return (ts.to_period('M') + 1).to_timestamp()
+
+
+def _ceil(ts, level):
+    floored = _floor(pd.DatetimeIndex([ts]), level)[0]
+    return ts if floored == ts else _next_boundary(ts, level)
+
+
+def _keys(index):
+    return index.values.astype('datetime64[ns]').view(np.int64)
+
+
+def _empty_stats():
+    return np.array([0.0, 0.0, np.inf, -np.inf, 0.0])
+
+
+class RollupStore:
+    """
+    Incremental 15-min -> hourly -> daily -> monthly aggregates for one user.
+    Range queries are answered from the coarsest level that fully covers each
+    part of the range, so a year costs about the same as a day.
+    Clients re-send overlapping windows, so readings at or before the newest
+    ingested timestamp are skipped and each reading is counted once.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.keys = {level: np.empty(0, dtype=np.int64) for level in LEVELS}
+        self.stats = {level: np.empty((0, 5), dtype=np.float64) for level in LEVELS}
+        self.last_ingested = None  # newest ingested timestamp (ns)
+
+    @classmethod
+    def load(cls, path):
+        store = cls(path=path)
+        if path and os.path.exists(path):
+            try:
+                state = joblib.load(path)
+                store.keys = state['keys']
+                store.stats = state['stats']
+                store.last_ingested = state.get('last_ingested')
+                if store.last_ingested is None and len(store.keys['15min']):
+                    # Stores saved before this was tracked: start of the newest bucket
+                    store.last_ingested = int(store.keys['15min'][-1])
+            except Exception as e:
+                print(f"Error loading rollups, starting empty: {e}", file=sys.stderr)
+        return store
+
+    def save(self):
+        if not self.path:
+            return
+        atomic_dump({'keys': self.keys, 'stats': self.stats, 'last_ingested': self.last_ingested}, self.path)
+
+    def add(self, timestamps, values):
+        """Merge new readings into every level; returns how many were new"""
+        index = _to_naive(pd.DatetimeIndex(pd.to_datetime(timestamps)))
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values) & ~index.isna() & ~index.duplicated()
+        if self.last_ingested is not None:
+            valid &= _keys(index) > self.last_ingested
+        index, values = index[valid], values[valid]
+        if len(values) == 0:
+            return 0
+        self.last_ingested = int(_keys(index).max())
+
+        for level in LEVELS:
+            frame = pd.DataFrame({'key': _keys(_floor(index, level)), 'v': values, 'sq': values * values})
+            grouped = frame.groupby('key', sort=True)
+            agg = grouped['v'].agg(['sum', 'count', 'min', 'max'])
+            new_stats = np.column_stack([
+                agg['sum'].to_numpy(),
+                agg['count'].to_numpy(dtype=np.float64),
+                agg['min'].to_numpy(),
+                agg['max'].to_numpy(),
+                grouped['sq'].sum().to_numpy(),
+            ])
+            self._merge(level, agg.index.to_numpy(dtype=np.int64), new_stats)
+
+        return len(values)
+
+    def _merge(self, level, keys, new_stats):
+        """Combine into existing buckets, insert the rest in key order"""
+        store_keys = self.keys[level]
+        stats = self.stats[level]
+
+        idx = np.searchsorted(store_keys, keys)
+        if len(store_keys):
+            exists = (idx < len(store_keys)) & (store_keys[np.minimum(idx, len(store_keys) - 1)] == keys)
+        else:
+            exists = np.zeros(len(keys), dtype=bool)
+
+        if exists.any():
+            pos = idx[exists]
+            merged = new_stats[exists]
+            stats[pos, SUM] += merged[:, SUM]
+            stats[pos, COUNT] += merged[:, COUNT]
+            stats[pos, MIN] = np.minimum(stats[pos, MIN], merged[:, MIN])
+            stats[pos, MAX] = np.maximum(stats[pos, MAX], merged[:, MAX])
+            stats[pos, SUMSQ] += merged[:, SUMSQ]
+
+        fresh = ~exists
+        if fresh.any():
+            self.keys[level] = np.insert(store_keys, idx[fresh], keys[fresh])
+            self.stats[level] = np.insert(stats, idx[fresh], new_stats[fresh], axis=0)
+
+    def _level_slice(self, level, start, end):
+        """Combined stats of buckets with start in [start, end) at one level"""
+        keys = self.keys[level]
+        lo = np.searchsorted(keys, start.value, side='left')
+        hi = np.searchsorted(keys, end.value, side='left')
+        block = self.stats[level][lo:hi]
+        if len(block) == 0:
+            return _empty_stats()
+        return np.array([
+            block[:, SUM].sum(), block[:, COUNT].sum(),
+            block[:, MIN].min(), block[:, MAX].max(), block[:, SUMSQ].sum(),
+        ])
+
+    def _query(self, start, end, level_idx):
+        if start >= end:
+            return _empty_stats()
+
+        level = LEVELS[level_idx]
+        if level_idx == 0:
+            return self._level_slice(level, _ceil(start, level), end)
+
+        full_start = _ceil(start, level)
+        full_end = _floor(pd.DatetimeIndex([end]), level)[0]
+        if full_start >= full_end:
+            return self._query(start, end, level_idx - 1)
+
+        parts = [
+            self._level_slice(level, full_start, full_end),
+            self._query(start, full_start, level_idx - 1),
+            self._query(full_end, end, level_idx - 1),
+        ]
+        return np.array([
+            sum(p[SUM] for p in parts), sum(p[COUNT] for p in parts),
+            min(p[MIN] for p in parts), max(p[MAX] for p in parts), sum(p[SUMSQ] for p in parts),
+        ])
+
+    def extent(self):
+        """(first, end) of ingested data, or None"""
+        keys = self.keys['15min']
+        if len(keys) == 0:
+            return None
+        return pd.Timestamp(keys[0]), pd.Timestamp(keys[-1]) + pd.Timedelta(minutes=15)
+
+    def query(self, start=None, end=None):
+        """Aggregate stats over [start, end); defaults to all ingested data"""
+        extent = self.extent()
+        if extent is None:
+            return _empty_stats()
+        start = _to_naive(pd.Timestamp(start)) if start is not None else extent[0]
+        end = _to_naive(pd.Timestamp(end)) if end is not None else extent[1]
+        return self._query(start, end, len(LEVELS) - 1)
+
+    def usage_pattern(self, start=None, end=None):
+        """Same statistics as EnergyMLEngine.get_usage_pattern, from rollups"""
+        stats = self.query(start, end)
+        count = stats[COUNT]
+        if count == 0:
+            return {}
+
+        mean = stats[SUM] / count
+        variance = max(stats[SUMSQ] - stats[SUM] * mean, 0.0) / (count - 1) if count > 1 else float('nan')
+        return {
+            'average_usage': float(mean),
+            'peak_usage': float(stats[MAX]),
+            'min_usage': float(stats[MIN]),
+            'std_dev': float(np.sqrt(variance)),
+            'variance': float(variance),
+        }
+
+    def buckets(self, level, start=None, end=None):
+        """Per-bucket stats at one level (e.g. hourly chart data)"""
+        keys = self.keys[level]
+        lo = 0 if start is None else np.searchsorted(keys, _to_naive(pd.Timestamp(start)).value)
+        hi = len(keys) if end is None else np.searchsorted(keys, _to_naive(pd.Timestamp(end)).value)
+        stats = self.stats[level][lo:hi]
+        df = pd.DataFrame(stats, columns=['sum', 'count', 'min', 'max', 'sumsq'],
+                          index=pd.to_datetime(keys[lo:hi]))
+        df['mean'] = df['sum'] / df['count']
+        return df
@@ -0,0 +1,193 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+import resource_governor
+from atomic_file import atomic_dump
+from disaggregation import feature_frame
+from forest_compression import compress_forest
+from model_store import MODELS_DIR, ModelStore
+from streaming_train import ISOLATION_TREE_SAMPLES, Reservoir
+
+SEGMENTS_DIR = os.path.join(MODELS_DIR, 'segments')
+CALIBRATION_FILE = 'segment.pkl'
+CONTAMINATION = 0.05
+N_ESTIMATORS = 150
+
+
+def usage_profile(power, timestamps=None):
+    """
+    Compact 8-value usage profile: level, variability, baseline/peak ratios
+    and the share of energy in each 6-hour daypart.
+    """
+    power = np.asarray(power, dtype=np.float64)
+    valid = np.isfinite(power)
+    hours = None
+    if timestamps is not None:
+        hours = pd.DatetimeIndex(pd.to_datetime(timestamps)).hour.to_numpy()
+        valid &= hours >= 0
+    power = power[valid]
+    if len(power) == 0:
+        return np.concatenate([[0.0, 0.0, 0.0, 0.0], np.full(4, 0.25)])
+
+    mean = float(power.mean())
+    scale = mean if mean > 0 else 1.0
+    dayparts = np.full(4, 0.25)
+    if hours is not None:
+        energy = np.bincount(hours[valid].astype(np.int64) // 6, weights=power, minlength=4)
+        if energy.sum() > 0:
+            dayparts = energy / energy.sum()
+
+    return np.concatenate([[
+        np.log1p(mean),
+        float(power.std()) / scale,
+        float(np.percentile(power, 10)) / scale,
+        float(np.percentile(power, 90)) / scale,
+    ], dayparts])
+
+
+def _user_series(frame):
+    """Power array and optional timestamps from a per-user frame"""
+    power_col = next(c for c in ['power', 'Power', 'Global_active_power'] if c in frame.columns)
+    timestamps = frame['timestamp'] if 'timestamp' in frame.columns else None
+    return frame[power_col].to_numpy(dtype=np.float64), timestamps
+
+
+def _level(power):
+    level = float(np.nanmedian(power)) if len(power) else 0.0
+    return level if level > 0 else 1.0
+
+
+def _score(segment_model, power):
+    X = segment_model['scaler'].transform(feature_frame(power))
+    return segment_model['anomaly_model'].score_samples(X)
+
+
+def calibration_path(user_id, segments_dir=SEGMENTS_DIR):
+    """A user's segment assignment and calibration, kept next to the segment models"""
+    return os.path.join(segments_dir, 'users', f"user_{user_id}", CALIBRATION_FILE)
+
+
+def write_calibration(user_id, calibration, segments_dir=SEGMENTS_DIR):
+    """Atomically write a user's segment assignment and calibration"""
+    path = calibration_path(user_id, segments_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_dump(calibration, path)
+
+
+def train_segments(users, n_segments=4, segments_dir=SEGMENTS_DIR, random_state=42):
+    """
+    Cluster users on usage profiles and train one shared model per segment.
+
+    users: {user_id: DataFrame with power/Power/Global_active_power and optional timestamp}
+    Each user gets a small calibration (power scale to the segment level and
+    their own score threshold) in <segments_dir>/users/user_<id>/segment.pkl.
+    Returns {user_id: segment}.
+    """
+    user_ids = list(users)
+    series = {uid: _user_series(users[uid]) for uid in user_ids}
+    profiles = np.vstack([usage_profile(*series[uid]) for uid in user_ids])
+
+    n_segments = min(n_segments, len(user_ids))
+    profile_scaler = StandardScaler()
+    kmeans = KMeans(n_clusters=n_segments, n_init=10, random_state=random_state)
+    labels = kmeans.fit_predict(profile_scaler.fit_transform(profiles))
+
+    feature_names = list(feature_frame([]).columns)
+    segment_levels = {}
+    artifacts = {'segmenter': {'profile_scaler': profile_scaler, 'kmeans': kmeans, 'levels': segment_levels}}
+    for segment in range(n_segments):
+        members = [uid for uid, label in zip(user_ids, labels) if label == segment]
+        level = float(np.median([_level(series[uid][0]) for uid in members]))
+        segment_levels[segment] = level
+
+        # Pool members' readings, rescaled to the segment level, in constant memory
+        reservoir = Reservoir(N_ESTIMATORS * ISOLATION_TREE_SAMPLES, len(feature_names), random_state)
+        for uid in members:
+            power = series[uid][0] * (level / _level(series[uid][0]))
+            reservoir.add(feature_frame(power).fillna(0).to_numpy())
+
+        sample = pd.DataFrame(reservoir.sample(), columns=feature_names)
+        scaler = StandardScaler()
+        model = IsolationForest(
+            n_estimators=N_ESTIMATORS,
+            contamination=CONTAMINATION,
+            random_state=random_state,
+            max_samples='auto',
+            n_jobs=resource_governor.threads_for('train')
+        )
+        X_sample = scaler.fit_transform(sample)
+        model.fit(X_sample)
+        artifacts[f"segment_{segment}"] = {'scaler': scaler, 'anomaly_model': compress_forest(model, X_sample)}
+
+    version = ModelStore(segments_dir).publish(artifacts)
+
+    assignments = {}
+    for uid, segment in zip(user_ids, labels):
+        segment = int(segment)
+        power = series[uid][0]
+        power_scale = segment_levels[segment] / _level(power)
+        scores = _score(artifacts[f"segment_{segment}"], power[np.isfinite(power)] * power_scale)
+        write_calibration(uid, {
+            'segment_version': version,
+            'segment': segment,
+            'power_scale': power_scale,
+            'score_offset': float(np.quantile(scores, CONTAMINATION)),
+        }, segments_dir)
+        assignments[uid] = segment
+    return assignments
+
+
+def assign_user(user_id, frame, segments_dir=SEGMENTS_DIR):
+    """Place a new user into an existing segment and calibrate without retraining"""
+    store = ModelStore(segments_dir)
+    version = store.current_version()
+    if version is None:
+        raise ValueError('No segment models trained yet')
+
+    segmenter = store.load_artifact(version, 'segmenter')
+    power, timestamps = _user_series(frame)
+    profile = usage_profile(power, timestamps)[None, :]
+    segment = int(segmenter['kmeans'].predict(segmenter['profile_scaler'].transform(profile))[0])
+
+    segment_model = store.load_artifact(version, f"segment_{segment}")
+    power_scale = segmenter['levels'][segment] / _level(power)
+    scores = _score(segment_model, power[np.isfinite(power)] * power_scale)
+
+    write_calibration(user_id, {
+        'segment_version': version,
+        'segment': segment,
+        'power_scale': power_scale,
+        'score_offset': float(np.quantile(scores, CONTAMINATION)),
+    }, segments_dir)
+    return segment
+
+
+def load_long_format(path):
+    """Read a long-format table (user_id, timestamp, power) into per-user frames"""
+    df = pd.read_csv(path)
+    return {uid: group.reset_index(drop=True) for uid, group in df.groupby('user_id', sort=False)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train shared segment models for a fleet of users')
+    parser.add_argument('readings', help='CSV with user_id, timestamp, power columns')
+    parser.add_argument('--segments', type=int, default=4)
+    args = parser.parse_args()
+
+    users = load_long_format(args.readings)
+    if not users:
+        print('No users found', file=sys.stderr)
+        raise SystemExit(1)
+
+    assignments = train_segments(users, args.segments)
+    counts = pd.Series(assignments).value_counts().sort_index()
+    print(f"✅ Trained {len(counts)} segment models for {len(assignments)} users")
+    for segment, count in counts.items():
+        print(f"   segment {segment}: {count} users")
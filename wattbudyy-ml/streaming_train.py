@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 50_000
+ISOLATION_TREE_SAMPLES = 256  # what max_samples='auto' resolves to
+
+
+class Reservoir:
+    """
+    Uniform fixed-size sample of a row stream (Algorithm R, vectorized per chunk).
+    Every row seen so far has the same probability of being in the sample.
+    """
+
+    def __init__(self, capacity, n_features, random_state=42, dtype=np.float64):
+        self.capacity = capacity
+        self.rows = np.empty((capacity, n_features), dtype=dtype)
+        self.seen = 0
+        self.rng = np.random.default_rng(random_state)
+
+    def add(self, X):
+        X = np.asarray(X, dtype=self.rows.dtype)
+        n = len(X)
+        if n == 0:
+            return
+
+        # Fill phase: the first `capacity` rows go straight in
+        fill = min(max(self.capacity - self.seen, 0), n)
+        if fill:
+            self.rows[self.seen:self.seen + fill] = X[:fill]
+
+        # Replacement phase: row i (global index) replaces slot j ~ U[0, i] if j < capacity
+        rest = X[fill:]
+        if len(rest):
+            positions = np.arange(self.seen + fill, self.seen + n)
+            slots = self.rng.integers(0, positions + 1)
+            take = slots < self.capacity
+            slots, rest = slots[take], rest[take]
+            # Later rows win when several target the same slot (sequential semantics)
+            _, last = np.unique(slots[::-1], return_index=True)
+            keep = len(slots) - 1 - last
+            self.rows[slots[keep]] = rest[keep]
+
+        self.seen += n
+
+    def sample(self):
+        return self.rows[:min(self.seen, self.capacity)]
+
+
+def iter_chunks(source, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield DataFrame chunks from a CSV path, a DataFrame or an iterable of DataFrames"""
+    if isinstance(source, str):
+        yield from pd.read_csv(source, chunksize=chunksize)
+    elif isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize]
+    else:
+        for chunk in source:
+            yield chunk if isinstance(chunk, pd.DataFrame) else pd.DataFrame(chunk)
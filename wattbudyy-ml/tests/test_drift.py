@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from benchmark_memory import synthetic_history
+from ml_engine import EnergyMLEngine, process_request
+
+WINDOW = 96
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    assert EnergyMLEngine('drift_test', str(tmp_path))._train_model(synthetic_history(3000))
+    return str(tmp_path)
+
+
+def test_detect_accepts_columns(models_dir):
+    columns = synthetic_history(WINDOW, seed=1).drop(columns='timestamp')
+    request = {'user_id': 'drift_test', 'action': 'detect',
+               'power_data': {name: values.tolist() for name, values in columns.items()}}
+
+    result = process_request(request, models_dir)
+    assert 'error' not in result
+    assert len(result['scores']) == WINDOW
+    assert result['drift']['samples'] == WINDOW
+
+
+def test_overlapping_windows_are_observed_once(models_dir):
+    power = np.random.default_rng(1).gamma(2.0, 0.8, 2 * WINDOW).tolist()
+    step = WINDOW // 2
+
+    for start in range(0, WINDOW + 1, step):
+        request = {'user_id': 'drift_test', 'action': 'detect', 'power_data': power[start:start + WINDOW]}
+        result = process_request(request, models_dir)
+    assert result['drift']['samples'] == 2 * WINDOW
+
+    # Repeating the last window (a result-cache hit) adds nothing
+    assert process_request(request, models_dir)['drift']['samples'] == 2 * WINDOW
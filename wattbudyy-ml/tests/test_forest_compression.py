@@ -0,0 +1,116 @@
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+
+import forest_compression
+from forest_compression import (MODEL_TOLERANCE, CompactIsolationForest, check_parity, compress_forest,
+                                label_disagreement)
+
+INT16_TOLERANCE = 0.05  # max |score or probability change| from int16 thresholds alone
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(3000, 7)).astype(np.float32)
+    X[:60] += 6  # a few clear outliers
+    return X[:2000], X[2000:]
+
+
+@pytest.fixture(scope='module')
+def isolation_forest(data):
+    X_train, _ = data
+    return IsolationForest(n_estimators=100, contamination=0.05, random_state=42).fit(X_train)
+
+
+@pytest.fixture(scope='module')
+def random_forest(data):
+    X_train, _ = data
+    y = (X_train[:, 0] + X_train[:, 1] > 0.5).astype(int)
+    return RandomForestClassifier(n_estimators=50, random_state=42).fit(X_train, y)
+
+
+@pytest.fixture(params=['numpy', 'sklearn'])
+def traversal(request, monkeypatch):
+    """Run a test with small-batch (NumPy) and large-batch (sklearn Tree) routing"""
+    monkeypatch.setattr(forest_compression, 'SKLEARN_MIN_ROWS', 10**9 if request.param == 'numpy' else 0)
+    return request.param
+
+
+def test_float32_routes_exactly_like_sklearn(isolation_forest, data, traversal):
+    _, X = data
+    compact = compress_forest(isolation_forest, precision='float32', tolerance=0)
+
+    leaves = compact.trees.leaves(X) - compact.trees.roots
+    expected = np.column_stack([tree.apply(X) for tree in isolation_forest.estimators_])
+    np.testing.assert_array_equal(leaves, expected)
+
+    # Same leaves; only the float32 leaf payload separates the scores
+    np.testing.assert_allclose(compact.score_samples(X), isolation_forest.score_samples(X), rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(compact.predict(X), isolation_forest.predict(X))
+
+
+def test_float32_classifier_matches_sklearn(random_forest, data, traversal):
+    _, X = data
+    compact = compress_forest(random_forest, precision='float32', tolerance=0)
+
+    np.testing.assert_allclose(compact.predict_proba(X), random_forest.predict_proba(X), rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(compact.predict(X), random_forest.predict(X))
+
+
+def test_int16_within_tolerance(isolation_forest, random_forest, data, traversal):
+    _, X = data
+    for forest in (isolation_forest, random_forest):
+        compact = compress_forest(forest, precision='int16', tolerance=0)
+        assert compact.trees.precision == 'int16'
+        parity = check_parity(forest, compact, X)
+        assert parity['max_abs_diff'] <= INT16_TOLERANCE
+        assert parity['label_agreement'] >= 0.99
+
+
+@pytest.mark.parametrize('precision', ['float32', 'int16'])
+@pytest.mark.parametrize('tolerance', [0.05, MODEL_TOLERANCE, 0.3])
+def test_truncate_stays_within_tolerance_of_original(isolation_forest, data, precision, tolerance):
+    X_val, _ = data
+    compact = compress_forest(isolation_forest, X_val, precision=precision, tolerance=tolerance)
+
+    assert compact.n_estimators <= len(isolation_forest.estimators_)
+    assert len(compact.trees.roots) == compact.n_estimators
+    # Measured against the uncompressed forest: quantization and truncation together
+    assert label_disagreement(compact.predict(X_val), isolation_forest.predict(X_val)) <= tolerance
+
+
+def test_default_tolerance_drops_trees(isolation_forest, random_forest, data):
+    X_val, _ = data
+    y = (X_val[:, 0] + X_val[:, 1] > 0.5).astype(int)
+    assert compress_forest(isolation_forest, X_val).n_estimators < len(isolation_forest.estimators_)
+    compact = compress_forest(random_forest, X_val)
+    assert compact.n_estimators < len(random_forest.estimators_)
+    assert (compact.predict(X_val) == y).mean() >= (random_forest.predict(X_val) == y).mean() - 0.02
+
+
+def test_truncate_refits_offset_to_flagged_fraction(isolation_forest, data):
+    X_val, _ = data
+    compact = compress_forest(isolation_forest, X_val, precision='float32')
+
+    expected = (isolation_forest.predict(X_val) == -1).mean()
+    flagged = (compact.predict(X_val) == -1).mean()
+    assert abs(flagged - expected) <= 1 / len(X_val) + 1e-9
+
+
+def test_compact_forest_is_a_drop_in(isolation_forest, data):
+    _, X = data
+    compact = CompactIsolationForest(isolation_forest)
+    np.testing.assert_allclose(compact.decision_function(X), compact.score_samples(X) - compact.offset_)
+    assert compress_forest(isolation_forest, precision='none') is isolation_forest
+
+
+def test_sklearn_trees_are_not_pickled(isolation_forest, data, traversal):
+    _, X = data
+    compact = CompactIsolationForest(isolation_forest)
+    size = len(pickle.dumps(compact))
+    scores = compact.score_samples(X)
+    assert len(pickle.dumps(compact)) == size
+    np.testing.assert_array_equal(pickle.loads(pickle.dumps(compact)).score_samples(X), scores)
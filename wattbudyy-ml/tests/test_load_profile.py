@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import numpy as np
+
+from benchmark_memory import synthetic_history
+from load_profile import build_load_profile, peak_context
+from ml_engine import EnergyMLEngine
+
+
+def _peak_time(profile):
+    weekday, slot = np.unravel_index(np.argmax(profile['profile']), profile['profile'].shape)
+    # 2025-01-06 is a Monday
+    return datetime(2025, 1, 6 + int(weekday), int(slot) // 4, (int(slot) % 4) * 15)
+
+
+def test_peak_context_is_in_kw_for_watt_histories():
+    history = synthetic_history(96 * 28)
+    in_watts = history.assign(Global_active_power=history['Global_active_power'] * 1000)
+
+    kw_profile, w_profile = build_load_profile(history), build_load_profile(in_watts)
+    when = _peak_time(kw_profile)
+    kw, w = peak_context(kw_profile, when), peak_context(w_profile, when)
+    assert kw is not None and w is not None
+    assert np.isclose(w['expected_load'], kw['expected_load'], rtol=1e-4)
+    assert np.isclose(w['shiftable_load'], kw['shiftable_load'], rtol=1e-4)
+
+
+def test_default_model_has_no_load_profile(tmp_path):
+    engine = EnergyMLEngine('profile_test', str(tmp_path))
+    assert engine.train_streaming([synthetic_history(96 * 28)], own_readings=False)
+    assert engine.load_profile is None
+
+    engine = EnergyMLEngine('profile_test', str(tmp_path))
+    assert engine.load_or_train_model() and engine.load_profile is None
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from benchmark_memory import DETECT_BYTES_PER_POINT, peak_bytes, synthetic_history
+from disaggregation import FEATURE_COLUMNS, feature_matrix
+from ml_engine import EnergyMLEngine, _scale_inplace
+
+POINTS = 200_000
+# One float32 (n, 7) matrix is 28 B/point; building and scaling it must not copy it
+FEATURE_BYTES_PER_POINT = 4 * len(FEATURE_COLUMNS) + 4
+
+
+@pytest.fixture(scope='module')
+def power():
+    return np.random.default_rng(0).gamma(2.0, 0.8, POINTS).astype(np.float32)
+
+
+def test_feature_matrix_is_built_and_scaled_in_place(power):
+    scaler = StandardScaler().fit(feature_matrix(power[:10_000]))
+
+    def features():
+        X = feature_matrix(power)
+        assert X.dtype == np.float32
+        assert _scale_inplace(scaler, X) is X
+
+    assert peak_bytes(features) / POINTS <= FEATURE_BYTES_PER_POINT
+
+
+def test_detect_stays_within_budget(power, tmp_path):
+    engine = EnergyMLEngine('memory_test', str(tmp_path))
+    assert engine._train_model(synthetic_history(20_000))
+
+    result = engine.detect_anomalies(power)
+    assert 'error' not in result and len(result['scores']) == POINTS
+    assert peak_bytes(engine.detect_anomalies, power) / POINTS <= DETECT_BYTES_PER_POINT
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from benchmark_memory import synthetic_history
+from ml_engine import EnergyMLEngine
+
+
+@pytest.fixture
+def published(tmp_path):
+    """Two published versions of one user's model, oldest first"""
+    engine = EnergyMLEngine('store_test', str(tmp_path))
+    for seed in (1, 2):
+        assert engine._train_model(synthetic_history(3000, seed=seed))
+    versions = engine.store.versions()
+    assert len(versions) == 2 and engine.store.current_version() == versions[-1]
+    return engine.store, versions
+
+
+def _truncate(store, version):
+    path = os.path.join(store.version_dir(version), 'anomaly_model.pkl')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+
+
+def test_unreadable_current_falls_back_to_previous_version(published, tmp_path):
+    store, versions = published
+    _truncate(store, versions[-1])
+
+    engine = EnergyMLEngine('store_test', str(tmp_path))
+    assert engine.load_or_train_model()
+    assert engine.version == versions[0]
+    # Nothing retrained in place of the user's model
+    assert store.versions() == versions
+
+
+def test_no_default_model_while_user_has_versions(published, tmp_path):
+    store, versions = published
+    for version in versions:
+        _truncate(store, version)
+
+    engine = EnergyMLEngine('store_test', str(tmp_path))
+    assert not engine.load_or_train_model()
+    assert engine.anomaly_model is None
+    assert store.versions() == versions
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from ml_engine import process_request
+from rollup import LEVELS, RollupStore
+
+WINDOW = 96
+
+
+def _readings(start, n, seed=0):
+    timestamps = pd.date_range(start, periods=n, freq='15min')
+    power = np.random.default_rng(seed).gamma(2.0, 0.8, n)
+    return [str(ts) for ts in timestamps], power.tolist()
+
+
+def _snapshot(store):
+    return {level: store.buckets(level).to_numpy().copy() for level in LEVELS}, store.usage_pattern()
+
+
+def test_same_window_twice_leaves_stats_unchanged(tmp_path):
+    timestamps, power = _readings('2025-01-01', WINDOW)
+    request = {'user_id': 'rollup_test', 'action': 'ingest', 'timestamps': timestamps, 'power_data': power}
+
+    assert process_request(request, str(tmp_path))['ingested'] == WINDOW
+    store = RollupStore.load(str(tmp_path / 'user_rollup_test' / 'rollups.pkl'))
+    before = _snapshot(store)
+
+    result = process_request(request, str(tmp_path))
+    assert result['ingested'] == 0 and result['skipped'] == WINDOW
+    after = _snapshot(RollupStore.load(store.path))
+    for level in LEVELS:
+        np.testing.assert_array_equal(after[0][level], before[0][level])
+    assert after[1] == before[1]
+
+
+def test_overlapping_windows_count_each_reading_once():
+    timestamps, power = _readings('2025-01-01', 2 * WINDOW)
+    store = RollupStore()
+    store.add(timestamps[:WINDOW], power[:WINDOW])
+    assert store.add(timestamps[WINDOW // 2:], power[WINDOW // 2:]) == WINDOW
+
+    pattern = store.usage_pattern()
+    assert store.query()[1] == 2 * WINDOW
+    assert np.isclose(pattern['average_usage'], np.mean(power))
+    assert np.isclose(pattern['std_dev'], np.std(power, ddof=1))
@@ -1,111 +1,305 @@
+import argparse
+import json
+import os
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-def validate_dataset(filename):
-    """Validate dataset integrity and quality"""
-    
-    print(f"\n✓ Validating: {filename}")
-    
+INTERVAL = pd.Timedelta(minutes=15)
+INTERVAL_NS = INTERVAL.value
+DEFAULT_CHUNKSIZE = 200_000
+
+
+class ContinuityTracker:
+    """
+    Streaming continuity check on 15-minute readings.
+    Seen intervals are kept in a bitmap sized by the time span (not the row
+    count), so gaps and duplicates are found even in out-of-order files.
+    """
+
+    def __init__(self):
+        self.base = None  # interval index of bitmap[0]
+        self.seen = np.zeros(0, dtype=bool)
+        self.last_ns = None
+        self.unparsed = 0
+        self.misaligned = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+
+    def _ensure_range(self, lo, hi):
+        if self.base is None:
+            self.base = lo
+            self.seen = np.zeros(hi - lo + 1, dtype=bool)
+            return
+        if lo < self.base:
+            self.seen = np.concatenate([np.zeros(self.base - lo, dtype=bool), self.seen])
+            self.base = lo
+        end = self.base + len(self.seen) - 1
+        if hi > end:
+            self.seen = np.concatenate([self.seen, np.zeros(hi - end, dtype=bool)])
+
+    def update(self, timestamps):
+        parsed = timestamps.notna().to_numpy()
+        self.unparsed += int((~parsed).sum())
+        ns = timestamps[parsed].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        if len(ns) == 0:
+            return
+
+        # Ordering, including the boundary with the previous chunk
+        sequence = ns if self.last_ns is None else np.concatenate([[self.last_ns], ns])
+        self.out_of_order += int((np.diff(sequence) < 0).sum())
+        self.last_ns = int(ns[-1])
+
+        aligned = ns % INTERVAL_NS == 0
+        self.misaligned += int((~aligned).sum())
+        slots = ns[aligned] // INTERVAL_NS
+        if len(slots) == 0:
+            return
+
+        unique, counts = np.unique(slots, return_counts=True)
+        self.duplicates += int((counts - 1).sum())
+
+        self._ensure_range(int(unique[0]), int(unique[-1]))
+        idx = unique - self.base
+        self.duplicates += int(self.seen[idx].sum())
+        self.seen[idx] = True
+
+    def summary(self):
+        if self.base is None:
+            return {'timestamps': 0, 'unparsed': self.unparsed}
+
+        missing = ~self.seen
+        # Runs of consecutive missing intervals
+        edges = np.diff(np.concatenate([[0], missing.view(np.int8), [0]]))
+        run_lengths = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+        start = pd.Timestamp(self.base * INTERVAL_NS)
+        end = pd.Timestamp((self.base + len(self.seen) - 1) * INTERVAL_NS)
+        return {
+            'start': str(start),
+            'end': str(end),
+            'expected_intervals': int(len(self.seen)),
+            'missing_intervals': int(missing.sum()),
+            'gaps': int(len(run_lengths)),
+            'largest_gap_intervals': int(run_lengths.max()) if len(run_lengths) else 0,
+            'duplicates': self.duplicates,
+            'out_of_order': self.out_of_order,
+            'misaligned': self.misaligned,
+            'unparsed': self.unparsed,
+        }
+
+    def ok(self):
+        summary = self.summary()
+        return (self.base is not None
+                and summary['missing_intervals'] == 0
+                and self.duplicates == 0
+                and self.out_of_order == 0
+                and self.misaligned == 0
+                and self.unparsed == 0)
+
+
+def _chunk_timestamps(chunk, time_cols):
+    if time_cols == ['timestamp']:
+        return pd.to_datetime(chunk['timestamp'], errors='coerce')
+    return pd.to_datetime(
+        chunk['Date'].astype(str) + ' ' + chunk['Time'].astype(str),
+        format='%d-%m-%Y %H:%M', errors='coerce'
+    )
+
+
+def validate_dataset(filename, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Validate dataset integrity and quality, streaming the file in chunks.
+    Returns a report dict (see print_report).
+    """
+    report = {'file': filename, 'checks': [], 'valid': False}
+
+    def check(name, passed, detail):
+        report['checks'].append({'name': name, 'passed': bool(passed), 'detail': detail})
+
     try:
-        df = pd.read_csv(filename)
+        columns = list(pd.read_csv(filename, nrows=0).columns)
     except Exception as e:
-        print(f"❌ Error reading file: {e}")
-        return False
-    
-    checks_passed = 0
-    total_checks = 0
-    
-    # Check 1: No empty dataframe
-    total_checks += 1
-    if len(df) > 0:
-        print(f"  ✓ Dataset not empty: {len(df)} records")
-        checks_passed += 1
+        report['error'] = f"Error reading file: {e}"
+        return report
+
+    power_col = next((c for c in ['Global_active_power', 'Power'] if c in columns), None)
+    anomaly_col = next((c for c in ['Anomaly_flag', 'Anomaly'] if c in columns), None)
+    if 'timestamp' in columns:
+        time_cols = ['timestamp']
+    elif 'Date' in columns and 'Time' in columns:
+        time_cols = ['Date', 'Time']
     else:
-        print(f"  ✗ Dataset is empty")
-    
+        time_cols = []
+
+    usecols = [c for c in [power_col, anomaly_col] if c] + time_cols
+    rows = 0
+    nulls = 0
+    min_power = np.inf
+    max_power = -np.inf
+    anomaly_sum = 0.0
+    anomaly_rows = 0
+    continuity = ContinuityTracker()
+
+    try:
+        if usecols:
+            reader = pd.read_csv(filename, usecols=usecols, chunksize=chunksize,
+                                 dtype={c: str for c in time_cols})
+        else:
+            reader = pd.read_csv(filename, usecols=[0], chunksize=chunksize)
+
+        for chunk in reader:
+            rows += len(chunk)
+            if power_col:
+                power = pd.to_numeric(chunk[power_col], errors='coerce')
+                nulls += int(power.isna().sum())
+                if power.notna().any():
+                    min_power = min(min_power, float(power.min()))
+                    max_power = max(max_power, float(power.max()))
+            if anomaly_col:
+                flags = pd.to_numeric(chunk[anomaly_col], errors='coerce')
+                anomaly_sum += float(flags.sum())
+                anomaly_rows += int(flags.notna().sum())
+            if time_cols:
+                continuity.update(_chunk_timestamps(chunk, time_cols))
+    except Exception as e:
+        report['error'] = f"Error reading file: {e}"
+        return report
+
+    report['records'] = rows
+
+    # Check 1: No empty dataframe
+    check('not_empty', rows > 0, f"{rows} records")
+
     # Check 2: Required columns
-    total_checks += 1
-    power_col = None
-    for col in ['Global_active_power', 'Power']:
-        if col in df.columns:
-            power_col = col
-            break
-    
-    if power_col:
-        print(f"  ✓ Power column found: {power_col}")
-        checks_passed += 1
-    else:
-        print(f"  ✗ No power consumption column found")
-    
+    check('power_column', power_col is not None, power_col or 'missing')
+
     # Check 3: No null values in power
-    total_checks += 1
-    if power_col and df[power_col].isnull().sum() == 0:
-        print(f"  ✓ No null values in power data")
-        checks_passed += 1
-    elif power_col:
-        nulls = df[power_col].isnull().sum()
-        print(f"  ⚠ {nulls} null values found ({nulls/len(df)*100:.2f}%)")
-    
+    check('no_null_power', power_col is not None and nulls == 0,
+          {'nulls': nulls, 'pct': round(nulls / rows * 100, 2) if rows else 0})
+
     # Check 4: Power values in reasonable range
-    total_checks += 1
-    if power_col:
-        min_power = df[power_col].min()
-        max_power = df[power_col].max()
-        if 0 <= min_power and max_power < 1000:
-            print(f"  ✓ Power range valid: {min_power:.2f} - {max_power:.2f} kW")
-            checks_passed += 1
-        else:
-            print(f"  ⚠ Power range unusual: {min_power:.2f} - {max_power:.2f} kW")
-    
+    range_ok = power_col is not None and np.isfinite(min_power) and 0 <= min_power and max_power < 1000
+    check('power_range', range_ok,
+          {'min': min_power if np.isfinite(min_power) else None,
+           'max': max_power if np.isfinite(max_power) else None})
+
     # Check 5: Anomaly distribution
-    total_checks += 1
-    anomaly_col = None
-    for col in ['Anomaly_flag', 'Anomaly']:
-        if col in df.columns:
-            anomaly_col = col
-            break
-    
-    if anomaly_col:
-        anomaly_pct = df[anomaly_col].mean() * 100
-        if 1 <= anomaly_pct <= 10:
-            print(f"  ✓ Anomaly distribution good: {anomaly_pct:.2f}%")
-            checks_passed += 1
-        else:
-            print(f"  ⚠ Anomaly distribution unusual: {anomaly_pct:.2f}%")
-    
-    # Check 6: Data continuity
-    total_checks += 1
-    if 'Date' in df.columns and 'Time' in df.columns:
-        print(f"  ✓ Date/Time columns present")
-        checks_passed += 1
-    
-    # Summary
-    print(f"\n  Result: {checks_passed}/{total_checks} checks passed")
-    return checks_passed == total_checks
+    anomaly_pct = anomaly_sum / anomaly_rows * 100 if anomaly_rows else None
+    check('anomaly_distribution', anomaly_pct is not None and 1 <= anomaly_pct <= 10,
+          {'column': anomaly_col, 'pct': round(anomaly_pct, 2) if anomaly_pct is not None else None})
+
+    # Check 6: Data continuity (gaps, duplicates, ordering on 15-min intervals)
+    check('continuity', bool(time_cols) and continuity.ok(),
+          continuity.summary() if time_cols else 'no Date/Time or timestamp columns')
+
+    report['valid'] = all(c['passed'] for c in report['checks'])
+    return report
+
+
+def _check_line(check, records):
+    """Console line for one check, or None when there is nothing to show"""
+    name, passed, detail = check['name'], check['passed'], check['detail']
+    if name == 'not_empty':
+        return f"✓ Dataset not empty: {records} records" if passed else "✗ Dataset is empty"
+    if name == 'power_column':
+        return f"✓ Power column found: {detail}" if passed else "✗ No power consumption column found"
+    if name == 'no_null_power':
+        if passed:
+            return "✓ No null values in power data"
+        return f"⚠ {detail['nulls']} null values found ({detail['pct']:.2f}%)" if detail['nulls'] else None
+    if name == 'power_range':
+        if detail['min'] is None:
+            return None
+        label = 'valid' if passed else 'unusual'
+        return f"{'✓' if passed else '⚠'} Power range {label}: {detail['min']:.2f} - {detail['max']:.2f} kW"
+    if name == 'anomaly_distribution':
+        if detail['pct'] is None:
+            return None
+        label = 'good' if passed else 'unusual'
+        return f"{'✓' if passed else '⚠'} Anomaly distribution {label}: {detail['pct']:.2f}%"
+    if name == 'continuity':
+        if isinstance(detail, str):
+            return f"✗ {detail}"
+        if passed:
+            return (f"✓ Data continuity: {detail['expected_intervals']} intervals, "
+                    f"{detail['start']} to {detail['end']}")
+        if 'expected_intervals' not in detail:
+            return f"⚠ Data continuity: no parseable timestamps ({detail['unparsed']} unparsed)"
+        return (f"⚠ Data continuity: {detail['missing_intervals']} missing intervals in "
+                f"{detail['gaps']} gaps (largest {detail['largest_gap_intervals']}), "
+                f"{detail['duplicates']} duplicates, {detail['out_of_order']} out of order, "
+                f"{detail['misaligned']} misaligned, {detail['unparsed']} unparsed")
+    return f"{'✓' if passed else '⚠'} {name}: {detail}"
+
+
+def print_report(report):
+    """Human-readable output for one file report"""
+    print(f"\n✓ Validating: {report['file']}")
+    if 'error' in report:
+        print(f"❌ {report['error']}")
+        return
+
+    for c in report['checks']:
+        line = _check_line(c, report.get('records', 0))
+        if line:
+            print(f"  {line}")
+
+    passed = sum(c['passed'] for c in report['checks'])
+    print(f"\n  Result: {passed}/{len(report['checks'])} checks passed")
+
+
+def validate_all(files, workers=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Validate files in parallel processes; reports keep input order"""
+    workers = workers or min(len(files), os.cpu_count() or 1)
+    if workers <= 1:
+        return [validate_dataset(f, chunksize) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(validate_dataset, files, [chunksize] * len(files)))
 
 
 if __name__ == '__main__':
-    datasets = [
+    default_datasets = [
         'synthetic_training_data.csv',
         'user_training_low.csv',
         'user_training_medium.csv',
         'user_training_high.csv',
         'user_training_commercial.csv',
     ]
-    
+
+    parser = argparse.ArgumentParser(description='Validate energy datasets before training')
+    parser.add_argument('files', nargs='*', default=default_datasets)
+    parser.add_argument('--workers', type=int, default=None, help='parallel file checks')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='rows per chunk')
+    parser.add_argument('--report', default='validation_report.json', help='JSON report path')
+    parser.add_argument('--json', action='store_true', help='print the structured report instead of the console summary')
+    args = parser.parse_args()
+
+    reports = validate_all(args.files, args.workers, args.chunksize)
+    all_valid = all(r['valid'] for r in reports)
+    result = {
+        'generated_at': datetime.now().isoformat(),
+        'all_valid': all_valid,
+        'files': reports,
+    }
+    with open(args.report, 'w') as f:
+        json.dump(result, f, indent=2, default=str)
+
+    if args.json:
+        print(json.dumps(result, indent=2, default=str))
+        raise SystemExit(0 if all_valid else 1)
+
     print("\n" + "="*60)
     print("🔍 DATASET VALIDATION")
     print("="*60)
-    
-    all_valid = True
-    for dataset in datasets:
-        if not validate_dataset(dataset):
-            all_valid = False
-    
+    for report in reports:
+        print_report(report)
+
     print("\n" + "="*60)
     if all_valid:
         print("✅ All datasets valid and ready for training!")
     else:
         print("⚠️  Some datasets need attention")
+    print(f"📄 Report saved: {args.report}")
     print("="*60)
@@ -0,0 +1,120 @@
+import json
+import struct
+import numpy as np
+
+# Binary framing for ml_engine stdin/stdout:
+#
+#   magic   4 bytes   b'WBF1'
+#   hlen    uint32 LE length of the JSON header (padded so payload is 8-byte aligned)
+#   header  JSON      {"fields": {...scalar/JSON fields...},
+#                      "arrays": [{"name": "power_data", "dtype": "<f4", "length": N}, ...]}
+#   payload           little-endian array buffers in header order, each padded to 8 bytes
+#
+# Array names may be dotted paths (e.g. "anomalies.scores") for nested results.
+
+MAGIC = b'WBF1'
+PREFIX_SIZE = 8
+ALIGNMENT = 8
+SUPPORTED_DTYPES = ('<f4', '<f8', '|i1', '|u1', '<i4')
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def is_binary_frame(buf):
+    """Check whether a raw stdin buffer uses the binary framing"""
+    return len(buf) >= PREFIX_SIZE and bytes(buf[:4]) == MAGIC
+
+
+def _set_path(target, name, value):
+    keys = name.split('.')
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = value
+
+
+def _wire_dtype(arr):
+    """Pick the on-wire dtype for an array (floats travel as float32)"""
+    if arr.dtype.kind == 'f':
+        return np.dtype('<f4')
+    if arr.dtype.kind == 'b':
+        return np.dtype('|u1')
+    if arr.dtype.kind in 'iu' and arr.dtype.itemsize == 1:
+        return arr.dtype
+    return np.dtype('<i4')
+
+
+def _split_arrays(obj, prefix, arrays):
+    """Walk a result dict, replacing ndarrays with wire specs"""
+    fields = {}
+    for key, value in obj.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, np.ndarray) and value.ndim == 1:
+            arrays.append((name, value))
+        elif isinstance(value, dict):
+            nested = _split_arrays(value, f"{name}.", arrays)
+            fields[key] = nested
+        else:
+            fields[key] = value
+    return fields
+
+
+def encode_frame(payload):
+    """
+    Encode a dict into a binary frame.
+    1-D NumPy arrays anywhere in the dict travel as raw buffers,
+    everything else goes into the JSON header.
+    """
+    arrays = []
+    fields = _split_arrays(payload, '', arrays)
+
+    specs = []
+    buffers = []
+    for name, arr in arrays:
+        dtype = _wire_dtype(arr)
+        data = np.ascontiguousarray(arr, dtype=dtype).tobytes()
+        specs.append({'name': name, 'dtype': dtype.str, 'length': int(arr.shape[0])})
+        buffers.append(data + b'\0' * (_align(len(data)) - len(data)))
+
+    header = json.dumps({'fields': fields, 'arrays': specs}, default=json_default).encode('utf-8')
+    # Pad with whitespace (valid JSON) so the payload starts aligned
+    header += b' ' * (_align(PREFIX_SIZE + len(header)) - PREFIX_SIZE - len(header))
+
+    return b''.join([MAGIC, struct.pack('<I', len(header)), header] + buffers)
+
+
+def decode_frame(buf):
+    """
+    Decode a binary frame into a dict.
+    Arrays are zero-copy np.frombuffer views over the input buffer.
+    """
+    if not is_binary_frame(buf):
+        raise ValueError('Not a WBF1 frame')
+
+    (header_len,) = struct.unpack_from('<I', buf, 4)
+    header = json.loads(bytes(buf[PREFIX_SIZE:PREFIX_SIZE + header_len]))
+    payload = header.get('fields', {})
+
+    offset = _align(PREFIX_SIZE + header_len)
+    for spec in header.get('arrays', []):
+        if spec['dtype'] not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported dtype {spec['dtype']} for {spec['name']}")
+        dtype = np.dtype(spec['dtype'])
+        length = int(spec['length'])
+        if offset + length * dtype.itemsize > len(buf):
+            raise ValueError(f"Truncated frame while reading {spec['name']}")
+        arr = np.frombuffer(buf, dtype=dtype, count=length, offset=offset)
+        _set_path(payload, spec['name'], arr)
+        offset = _align(offset + arr.nbytes)
+
+    return payload
+
+
+def json_default(obj):
+    """json.dumps fallback that understands NumPy values"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)